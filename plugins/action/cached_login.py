@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+import datetime
+import fcntl
+import os
+import threading
+
+import requests
+import yaml
+
+from ansible.plugins.action import ActionBase
+from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import AnsibleActions
+
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherAPI, RancherClusterSteveAPI
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin, reports_rancher_http_stats
+from ansible_collections.epfl_si.rancher.plugins.module_utils.kubeconfig import load_kubeconfig, load_kubeconfig_expiry, save_kubeconfig
+from ansible_collections.epfl_si.rancher.plugins.module_utils.token_cache import parse_expires_at
+
+
+# Outcomes of `_probe`, keyed by (absolute path, mtime, size) of the
+# kubeconfig file. Only positive outcomes are remembered; a file that
+# was found invalid gets replaced anyway. This only lasts as long as
+# the process (see “Process-wide state” in rancher_model.py); what
+# ensures that a kubeconfig is downloaded only once per cluster,
+# across hosts, is the re-check under `_locked` in `run`.
+_valid_kubeconfigs = set()
+_valid_kubeconfigs_lock = threading.Lock()
+
+
+class CachedLoginAction (ActionBase, RancherActionMixin):
+    """Ensure that a kubeconfig file holds valid credentials, downloading new ones if needed.
+
+    See operation details and Ansible-level documentation in
+    ../modules/cached_login.py which only exists for documentation
+    purposes.
+    """
+    @reports_rancher_http_stats
+    @AnsibleActions.run_method
+    def run (self, args, ansible_api):
+        self._init_rancher(ansible_api=ansible_api)
+
+        explicit_cluster_name = args.get('cluster_name')
+        if explicit_cluster_name:
+            self.rancher_cluster_name = explicit_cluster_name
+
+        path = os.path.abspath(os.path.expanduser(
+            args.get('kubeconfig') or self._expand_var('ansible_k8s_kubeconfig')))
+        self.result["kubeconfig"] = path
+        self.result["cluster_name"] = self.rancher_cluster_name
+
+        refresh_margin = args.get('refresh_margin')
+        if refresh_margin is None:
+            refresh_margin = self._expand_var('ansible_rancher_kubeconfig_refresh_margin', 3600)
+        self.refresh_margin = datetime.timedelta(seconds=int(refresh_margin))
+
+        if self._is_valid(path):
+            pass
+        elif self.ansible_api.check_mode.is_active:
+            self.result["changed"] = True
+            self.result["outcome"] = "refreshed"
+        else:
+            # Serialize with the other Ansible workers that want to refresh
+            # the same file; whoever comes in second will find it valid.
+            with self._locked(path):
+                if not self._is_valid(path):
+                    self._refresh(path)
+
+        self.result["summary"] = "%s: %s%s" % (
+            self.rancher_cluster_name, self.result["outcome"],
+            " (expires %s)" % self.result["expires_at"] if self.result.get("expires_at") else "")
+        return self.result
+
+    def _is_valid (self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        expires_at = load_kubeconfig_expiry(path)
+        self.result["expires_at"] = expires_at
+        expires_at = parse_expires_at(expires_at)
+        if expires_at is not None:
+            if expires_at - self.refresh_margin > datetime.datetime.now(datetime.timezone.utc):
+                self.result["outcome"] = "unexpired"
+                return True
+            else:
+                # No point in probing, as the credentials are (about
+                # to be) useless anyway.
+                return False
+
+        with _valid_kubeconfigs_lock:
+            if (path, stamp) in _valid_kubeconfigs:
+                self.result["outcome"] = "valid"
+                return True
+
+        if not self._probe(path):
+            return False
+
+        with _valid_kubeconfigs_lock:
+            _valid_kubeconfigs.add((path, stamp))
+        self.result["outcome"] = "valid"
+        return True
+
+    def _probe (self, path):
+        """Make one cheap, authenticated API call with the credentials in `path`.
+
+        Return True iff the API server accepts them.
+        """
+        try:
+            api = RancherClusterSteveAPI.from_kubeconfig(
+                load_kubeconfig(path), http_options=self.rancher_http_options).api
+        except (OSError, yaml.YAMLError, KeyError, TypeError, ValueError):
+            return False
+
+        try:
+            api.call('POST', '/apis/authentication.k8s.io/v1/selfsubjectreviews',
+                     body=dict(apiVersion='authentication.k8s.io/v1',
+                               kind='SelfSubjectReview'))
+            return True
+        except RancherAPI.Error as e:
+            if e.status_code != 404:
+                return False
+        except requests.RequestException:
+            # Unreachable API server, stale CA certificate etc.
+            return False
+
+        # Kubernetes < 1.28 has no SelfSubjectReview API.
+        try:
+            api.call('POST', '/apis/authorization.k8s.io/v1/selfsubjectaccessreviews',
+                     body=dict(apiVersion='authorization.k8s.io/v1',
+                               kind='SelfSubjectAccessReview',
+                               spec=dict(nonResourceAttributes=dict(
+                                   path='/version', verb='get'))))
+            return True
+        except (RancherAPI.Error, requests.RequestException):
+            return False
+
+    def _refresh (self, path):
+        kubeconfig = self.rancher_manager.get_cluster_by_name(
+            self.rancher_cluster_name).download_kubeconfig()
+        expires_at = self.rancher_manager.get_kubeconfig_expires_at(kubeconfig)
+
+        save_kubeconfig(path, kubeconfig, expires_at=expires_at)
+
+        self.result["changed"] = True
+        self.result["outcome"] = "refreshed"
+        self.result["expires_at"] = expires_at
+
+    @staticmethod
+    @contextmanager
+    def _locked (path):
+        """Hold an exclusive lock on `path`, by way of a `.lock` file next to it.
+
+        The lock file is removed on release. Whoever was waiting on it
+        in the meantime notices that it is now locking a deleted file,
+        and starts over.
+        """
+        lock_path = f"{path}.lock"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    current = os.stat(lock_path)
+                except FileNotFoundError:
+                    continue
+                if current.st_ino != os.fstat(fd).st_ino:
+                    continue
+
+                try:
+                    yield
+                finally:
+                    os.unlink(lock_path)
+                return
+            finally:
+                os.close(fd)
+
+ActionModule = CachedLoginAction
@@ -1,11 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
 from ansible.plugins.action import ActionBase
 from ansible_collections.epfl_si.actions.plugins.module_utils.ansible_api import AnsibleActions
 from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin
+from ansible_collections.epfl_si.rancher.plugins.module_utils.cluster_snapshot import ClusterSnapshot
+from ansible_collections.epfl_si.rancher.plugins.module_utils.kubeconfig import get_kubernetes_client
 
 class RancherNamespaceAction (ActionBase, RancherActionMixin):
     @AnsibleActions.run_method
     def run (self, args, ansible_api):
         self._init_rancher(ansible_api=ansible_api)
+        if "namespaces" in args:
+            return self._run_many(args)
+
         self.name = args["name"]
         self.is_system = (args.get("is_system", False)
                           # Stay compatibile with earlier misfeature:
@@ -23,56 +31,159 @@ class RancherNamespaceAction (ActionBase, RancherActionMixin):
 
     @property
     def _namespace_exists (self):
-        return len(self.ansible_api.jinja.lookup(
-            'epfl_si.k8s.k8s',
-            api_version='v1',
-            kind='namespace',
-            resource_name=self.name)) > 0
+        return len(self._get_namespace(self.name)) > 0
 
     @property
     def _kube_system_project_id (self):
-        kube_system_ns = self.ansible_api.jinja.lookup(
-            'epfl_si.k8s.k8s',
-            api_version='v1',
-            kind='namespace',
-            resource_name="kube-system")
+        kube_system_ns = self._get_namespace("kube-system")
         return kube_system_ns["metadata"]["annotations"][
             "field.cattle.io/projectId"]
 
+    def _get_namespace (self, name):
+        return self._snapshot.get(
+            "Namespace", None, name,
+            lambda: self.ansible_api.jinja.lookup(
+                'epfl_si.k8s.k8s',
+                api_version='v1',
+                kind='namespace',
+                resource_name=name))
+
+    @property
+    def _snapshot (self):
+        return ClusterSnapshot.of(self._kubeconfig_path)
+
     def _do_create_or_update (self):
         definition = self._k8s_bare_definition
+        annotations = self._desired_annotations(
+            self.is_system, self.project,
+            lambda: self._kube_system_project_id)
+        if annotations:
+            definition["metadata"]["annotations"] = annotations
 
-        def annotate (key, val):
-            definition["metadata"].setdefault("annotations", {})[key] = val
+        self.change("epfl_si.k8s.k8s",
+                    dict(definition=definition))
+        self._snapshot.invalidate("Namespace", None, self.name)
 
-        if self.is_system:
+    @staticmethod
+    def _desired_annotations (is_system, project, get_kube_system_project_id):
+        annotations = {}
+        if is_system:
             # https://github.com/rancher/dashboard/commit/28b9165b3446a41a85f382df68953e209888573a
-            annotate("management.cattle.io/system-namespace", "true")
-            if not self.project:
-                annotate("field.cattle.io/projectId",
-                         self._kube_system_project_id)
+            annotations["management.cattle.io/system-namespace"] = "true"
+            if not project:
+                annotations["field.cattle.io/projectId"] = get_kube_system_project_id()
 
-        if self.project:
-            annotate("field.cattle.io/projectId", "%s:%s" %
-                     (self.project["namespace"],
-                      self.project["name"]))
+        if project:
+            annotations["field.cattle.io/projectId"] = "%s:%s" % (
+                project["namespace"],
+                project["name"])
+        return annotations
 
-        self.change("epfl_si.k8s.k8s",
-                    dict(definition=definition))
+    def _run_many (self, args):
+        """Reconcile many namespaces at once.
+
+        Fetch all namespaces in one go, then only apply (with
+        server-side apply) or delete the ones that need it,
+        `concurrency` at a time.
+        """
+        desired = []
+        for ns in args["namespaces"]:
+            if isinstance(ns, str):
+                ns = dict(name=ns)
+            desired.append(dict(
+                name=ns["name"],
+                state=ns.get("state", args.get("state", "present")),
+                is_system=ns.get("is_system", False) or ns.get("system", False),
+                project=ns.get("project")))
 
+        client = get_kubernetes_client(self._kubeconfig_path).client
+        namespaces_api = client.resources.get(api_version="v1", kind="Namespace")
+        current = {ns["metadata"]["name"]: ns
+                   for ns in namespaces_api.get().to_dict()["items"]}
+
+        def kube_system_project_id ():
+            return current["kube-system"]["metadata"]["annotations"][
+                "field.cattle.io/projectId"]
+
+        todo = []
+        outcomes = {}
+        for ns in desired:
+            name = ns["name"]
+            if ns["state"] == "absent":
+                if name in current:
+                    todo.append(("deleted", name, None))
+                else:
+                    outcomes[name] = "unchanged"
+                continue
+
+            annotations = self._desired_annotations(
+                ns["is_system"], ns["project"], kube_system_project_id)
+            if name not in current:
+                todo.append(("created", name, annotations))
+                continue
+            current_annotations = current[name]["metadata"].get("annotations") or {}
+            if any(current_annotations.get(k) != v for k, v in annotations.items()):
+                todo.append(("updated", name, annotations))
+            else:
+                outcomes[name] = "unchanged"
+
+        def apply_one (what, name, annotations):
+            try:
+                if what == "deleted":
+                    namespaces_api.delete(name=name)
+                else:
+                    definition = self._bare_definition(name)
+                    if annotations:
+                        definition["metadata"]["annotations"] = annotations
+                    client.server_side_apply(
+                        namespaces_api, body=definition, name=name,
+                        field_manager="epfl_si.rancher", force_conflicts=True)
+                return what
+            except Exception as e:
+                return "failed: %s" % e
+            finally:
+                self._snapshot.invalidate("Namespace", None, name)
+
+        if self.ansible_api.check_mode.is_active:
+            outcomes.update((name, what) for what, name, _ in todo)
+        else:
+            with ThreadPoolExecutor(max_workers=int(args.get("concurrency", 8))) as executor:
+                outcomes.update(zip((name for _, name, _ in todo),
+                                    executor.map(lambda t: apply_one(*t), todo)))
+
+        self.result["namespaces"] = outcomes
+        if todo:
+            self.result["changed"] = True
+        failed = sorted(name for name, outcome in outcomes.items()
+                        if outcome.startswith("failed"))
+        if failed:
+            self.result["failed"] = True
+            self.result["msg"] = "Failed to reconcile namespace(s): %s" % ", ".join(failed)
+        return self.result
+
+    @property
+    def _kubeconfig_path (self):
+        return (self._expand_var("ansible_k8s_kubeconfig", None)
+                or os.environ.get("K8S_AUTH_KUBECONFIG")
+                or os.path.expanduser("~/.kube/config"))
 
     def _do_delete_namespace (self):
         self.change("epfl_si.k8s.k8s",
                     dict(state="absent",
                          definition=self._k8s_bare_definition))
+        self._snapshot.invalidate("Namespace", None, self.name)
 
     @property
     def _k8s_bare_definition (self):
+        return self._bare_definition(self.name)
+
+    @staticmethod
+    def _bare_definition (name):
         return {
             "apiVersion": "v1",
             "kind": "Namespace",
             "metadata": {
-                "name": self.name
+                "name": name
             }
         }
 
@@ -1,12 +1,19 @@
+from contextlib import contextmanager
 from functools import cached_property
 
+import hashlib
+import json
+import random
+import re
 import time
-import yaml
 
 from ansible.plugins.action import ActionBase
 from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import AnsibleActions
 from ansible_collections.epfl_si.actions.plugins.module_utils.compare import is_substruct
 from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin
+from ansible_collections.epfl_si.rancher.plugins.module_utils.cluster_snapshot import ClusterSnapshot
+from ansible_collections.epfl_si.rancher.plugins.module_utils.kubeconfig import load_kubeconfig, get_kubernetes_client, KubernetesClientAPI
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherAPI, RancherClusterSteveAPI
 
 class RancherHelmChartAction (ActionBase, RancherActionMixin):
     """Install / uninstall one Helm chart through the Rancher manager."""
@@ -23,99 +30,290 @@ class RancherHelmChartAction (ActionBase, RancherActionMixin):
     # would yield any additional benefits (such as performance or
     # transactional behavior), while on the other hand the costs are
     # pretty clear (i.e. it would make error processing a nightmare.)
+    #
+    # The `charts:` form of this action plugin doesn't contradict the
+    # above: it still makes one Steve call per chart, and waits for
+    # their respective operations separately. The point is merely that
+    # Rancher gets to run the (independent) `helm` commands at the
+    # same time.
     @AnsibleActions.run_method
     def run (self, args, ansible_api):
         self._init_rancher(ansible_api=ansible_api)
 
+        if "charts" in args:
+            return self._run_many(args)
+
+        self._configure(args)
+
+        desired_state = args.get("state", "present")
+        if desired_state == "present":
+            pending = self._do_present(args)
+        elif desired_state == "absent":
+            pending = self._do_absent()
+        else:
+            raise ValueError(f"Unsupported value for state: {desired_state}")
+        self._await_and_finish(desired_state, pending)
+
+        return self.result
+
+    def _configure (self, args):
         self.chart_name = args["chart"]
         self.release_name = args.get("release", self.chart_name)
         self.source_repository = args.get("repository", self.chart_name)
         self.timeout = args.get("timeout", "600s")
+        if isinstance(self.timeout, (int, float)):
+            self.timeout = f"{self.timeout}s"
+        # Validate now, rather than after Rancher started working:
+        self.timeout_seconds = parse_go_duration(self.timeout)
         self.force_redeploy = args.get("force_redeploy", False)
 
         namespace = args["namespace"]
         if isinstance(namespace, str):
             namespace = { "name": namespace }
         self.install_namespace = namespace["name"]
-        namespace_is_owned = namespace.get("owned", False)
+        self.namespace_is_owned = namespace.get("owned", False)
+        self.namespace_is_system = (namespace.get("system", False)
+                                    # Stay compatibile with earlier misfeature:
+                                    or namespace.get("is_system", False))
+
+        self.desired_state_digest = desired_state_digest(
+            repository=self.source_repository,
+            chart=self.chart_name,
+            release=self.release_name,
+            version=args.get("version"),
+            values=args.get("values", {}))
+
+        # Forget about whichever chart we were looking at before:
+        for cached in ("_helm_info", "_current_app"):
+            self.__dict__.pop(cached, None)
+
+    def _do_present (self, args):
+        """Install or upgrade the chart, without waiting.
+
+        Return the result of the Steve API call to pass to
+        `_await_cattle_operation`, or None if there was nothing to do
+        (or nothing to wait for, in check mode.)
+        """
+        if self.namespace_is_owned:
+            self._ensure_namespace("present", is_system=self.namespace_is_system)
+        return self._maybe_install_or_upgrade_helm_chart(
+            args.get("version"),
+            args.get("values", {}))
+
+    def _do_absent (self):
+        """Uninstall the chart, without waiting.
+
+        Return value is like `_do_present`'s. The owned namespace (if
+        any) is only deleted afterwards, by `_await_and_finish`.
+        """
+        if self._helm_chart_is_installed:
+            return self._do_uninstall_helm_chart()
+        return None
+
+    def _await_and_finish (self, desired_state, pending):
+        """Wait for `pending` (as returned by `_do_present` or `_do_absent`), then wrap up."""
+        if pending is not None:
+            if not self._await_cattle_operation(pending):
+                return
+            if desired_state == "present":
+                self._record_digest()
+        if desired_state == "absent" and self.namespace_is_owned:
+            self._ensure_namespace("absent")
+
+    def _run_many (self, args):
+        defaults = {k: v for k, v in args.items() if k not in ("charts", "state")}
+        charts = []
+        for i, chart_args in enumerate(args["charts"]):
+            if not (isinstance(chart_args, dict) and "chart" in chart_args):
+                self.result["failed"] = True
+                self.result["msg"] = f"charts[{i}]: expected a dict with a `chart` key, got {chart_args!r}"
+                return self.result
+            chart_args = dict(defaults, **chart_args)
+            chart_args.setdefault("release", chart_args["chart"])
+            charts.append(chart_args)
 
         desired_state = args.get("state", "present")
         if desired_state == "present":
-            if namespace_is_owned:
-                self._ensure_namespace(
-                    "present",
-                    is_system=(namespace.get("system", False)
-                               # Stay compatibile with earlier misfeature:
-                               or namespace.get("is_system", False)))
-            self._maybe_install_or_upgrade_helm_chart(
-                args.get("version"),
-                args.get("values", {}))
+            waves = dependency_waves(charts)
+            blockers_of = lambda chart: chart.get("depends_on", [])
         elif desired_state == "absent":
-            if self._helm_chart_is_installed:
-                self._do_uninstall_helm_chart()
-            if namespace_is_owned:
-                self._ensure_namespace("absent")
+            # Uninstall dependent charts first:
+            waves = list(reversed(dependency_waves(charts)))
+            blockers_of = lambda chart: [c["release"] for c in charts
+                                         if chart["release"] in c.get("depends_on", [])]
         else:
             raise ValueError(f"Unsupported value for state: {desired_state}")
 
+        self.result["charts"] = chart_results = {}
+        failed = set()
+        for wave in waves:
+            pending = []
+            for chart in wave:
+                chart_result = chart_results[chart["release"]] = dict(changed=False)
+                blockers = [b for b in blockers_of(chart) if b in failed]
+                if blockers:
+                    chart_result.update(skipped=True,
+                                        msg="Skipped because of %s" % ", ".join(blockers))
+                    continue
+                with self._chart_context(chart, chart_result):
+                    if desired_state == "present":
+                        operation = self._do_present(chart)
+                    else:
+                        operation = self._do_absent()
+                    pending.append((chart, chart_result, operation))
+
+            # All charts in the wave are now running concurrently
+            # Rancher-side; so awaiting them one after the other takes
+            # about as long as the slowest one. The next wave only
+            # starts once they are all done.
+            for chart, chart_result, operation in pending:
+                with self._chart_context(chart, chart_result):
+                    self._await_and_finish(desired_state, operation)
+
+            failed.update(chart["release"] for chart in wave
+                          if chart_results[chart["release"]].get("failed")
+                          or chart_results[chart["release"]].get("skipped"))
+
+        if any(r["changed"] for r in chart_results.values()):
+            self.result["changed"] = True
+        if failed:
+            self.result["failed"] = True
+            self.result["msg"] = "Failed chart(s): %s" % ", ".join(sorted(failed))
         return self.result
 
+    @contextmanager
+    def _chart_context (self, chart_args, chart_result):
+        """Direct `self.result` (and sub-action results) into `chart_result` for the duration."""
+        self._configure(chart_args)
+        saved_result = self.result
+        self.result = self._subaction.result = chart_result
+        try:
+            yield
+        except Exception as e:
+            chart_result.update(failed=True, msg=str(e))
+        finally:
+            self.result = self._subaction.result = saved_result
+
+    # Set on the `App` object after a successful install or upgrade, so
+    # that the next run can tell at a glance that there is nothing to do.
+    # It is removed before any upgrade; so that if the upgrade fails,
+    # the next run doesn't mistake the (failed) release for the one that
+    # the digest was recorded for.
+    _digest_annotation = "ansible.epfl.ch/rancher-helm-chart-digest"
+
     def _maybe_install_or_upgrade_helm_chart (self, helm_version=None, helm_values={}):
         if not self._helm_chart_is_installed:
-            self._do_helm_chart("install", helm_version, helm_values)
+            return self._do_helm_chart("install", helm_version, helm_values)
+        elif self.force_redeploy:
+            return self._do_helm_chart("upgrade", helm_version, helm_values)
+        elif (self._current_digest == self.desired_state_digest
+              and self._current_app_is_deployed):
+            return None
         elif ( (not self._is_already_installed(helm_version))
-               or (not is_substruct(helm_values, self._current_helm_values))
-               or self.force_redeploy ):
-            self._do_helm_chart("upgrade", helm_version, helm_values)
+               or (not is_substruct(helm_values, self._current_helm_values)) ):
+            return self._do_helm_chart("upgrade", helm_version, helm_values)
+        else:
+            # Up to date, but we had to look the hard way. Make it
+            # quicker next time:
+            self._record_digest()
+            return None
+
+    @property
+    def _current_digest (self):
+        annotations = self._current_app["metadata"].get("annotations") or {}
+        return annotations.get(self._digest_annotation)
+
+    @property
+    def _current_app_is_deployed (self):
+        info = (self._current_app.get("spec") or {}).get("info") or {}
+        return info.get("status") == "deployed"
+
+    def _record_digest (self):
+        self._set_digest_annotation(self.desired_state_digest)
+
+    def _clear_digest (self):
+        if self._current_digest is not None:
+            self._set_digest_annotation(None)
+
+    def _set_digest_annotation (self, digest):
+        if self.ansible_api.check_mode.is_active:
+            return
+        self._forget_app()
+        try:
+            # `None` deletes the annotation (this is a merge patch):
+            self._steve.annotate_app(
+                self.install_namespace, self.chart_name,
+                {self._digest_annotation: digest})
+        except RancherAPI.Error as e:
+            # Rancher may not have (re)created the `App` yet after
+            # install. No big deal; we'll just do a full comparison
+            # next time.
+            if e.status_code != 404:
+                raise
 
     def _do_helm_chart (self, action, helm_version=None, helm_values={}):
-        # This is a per-cluster Steve call, which doesn't work with
-        # the same credentials as
-        # ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model
-        # This the reason / excuse why we left this one API call stick
-        # out as a sore thumb as a “remote” Ansible module invocation,
-        # whereas pretty much everything else is called in-process
-        # from the Ansible manager through rancher_model. Oh well, if
-        # it works don't touch it 🤷
-        self._await_cattle_operation(self.change(
-            "epfl_si.k8s.k8s_api_call",
+        self.result["changed"] = True
+        if self.ansible_api.check_mode.is_active:
+            return None
+
+        if action == "upgrade":
+            self._clear_digest()
+        self._forget_app()
+        return self._steve.chart_action(
+            self.source_repository, action,
             {
-                "kubeconfig": self.kubeconfig,
-                "method": "POST",
-                "uri": f"/v1/catalog.cattle.io.clusterrepos/{self.source_repository}?action={action}",
-                "body": {
-                    "namespace": self.install_namespace,
-                    "charts": [
-                        # Just one chart, Vassili — See comment above.
-                        {
-                            "annotations": {
-                                # Further Golang RTFS suggests that
-                                # Steve doesn't actually support
-                                # anything else than `"cluster"`
-                                # there:
-                                "catalog.cattle.io/ui-source-repo-type": "cluster",
-                                "catalog.cattle.io/ui-source-repo": self.source_repository,
-                            },
-                            "chartName": self.chart_name,
-                            "releaseName": self.release_name,
-                            "version": helm_version,
-                            "resetValues": False,
-                            "values": helm_values,
-                        }
-                    ],
-                    "wait": True,
-                    "timeout": self.timeout,
-                    "force": self.force_redeploy and action == "upgrade"
-                }
-            }
-        ))
+                "namespace": self.install_namespace,
+                "charts": [
+                    # Just one chart, Vassili — See comment above.
+                    {
+                        "annotations": {
+                            # Further Golang RTFS suggests that
+                            # Steve doesn't actually support
+                            # anything else than `"cluster"`
+                            # there:
+                            "catalog.cattle.io/ui-source-repo-type": "cluster",
+                            "catalog.cattle.io/ui-source-repo": self.source_repository,
+                        },
+                        "chartName": self.chart_name,
+                        "releaseName": self.release_name,
+                        "version": helm_version,
+                        "resetValues": False,
+                        "values": helm_values,
+                    }
+                ],
+                "wait": True,
+                "timeout": self.timeout,
+                "force": self.force_redeploy and action == "upgrade"
+            })
 
-    def _await_cattle_operation (self, api_call_result):
+    @property
+    def _steve (self):
+        # This is a per-cluster Steve call, which doesn't work with
+        # the same credentials as `self.rancher_manager`; rather, we
+        # use the ones in the cluster's kubeconfig.
+        if not RancherClusterSteveAPI.is_rancher_proxied(self.kubeconfig):
+            raise ValueError(
+                f"{self.kubeconfig_path}: kubeconfig must point at the Rancher proxy "
+                "(https://<rancher>/k8s/clusters/<cluster ID>), as the Steve API "
+                "is not available on the cluster's own API server")
+        if RancherClusterSteveAPI.has_bearer_token(self.kubeconfig):
+            return RancherClusterSteveAPI.from_kubeconfig(
+                self.kubeconfig, http_options=self.rancher_http_options)
+        else:
+            # Client certificates, `exec` plugins etc.
+            return RancherClusterSteveAPI(KubernetesClientAPI(self.kubeconfig_path))
+
+    def _await_cattle_operation (self, api_response):
+        """Wait for the `Operation` that `api_response` points to.
+
+        Return True on success; otherwise, fail `self.result` and
+        return False.
+        """
         def ansible_fail (message):
             self.result["failed"] = True
             self.result["msg"] = message
+            return False
 
-        api_response = api_call_result["api_response"]
         api_response_type = api_response["type"]
         if not (api_response_type == "chartActionOutput"):
             return ansible_fail(f"Unexpected API response type: {api_response_type}")
@@ -123,30 +321,109 @@ class RancherHelmChartAction (ActionBase, RancherActionMixin):
         op_name = api_response["operationName"]
         op_ns = api_response["operationNamespace"]
 
-        operation_done = False
-        while not operation_done:
+        started = time.monotonic()
+        # Leave Rancher a little leeway past the Helm timeout, to
+        # report on the outcome:
+        deadline = started + self.timeout_seconds + 30
+        self.result["operation"] = stats = dict(
+            name=op_name, namespace=op_ns, events=0, polls=0)
+        try:
+            stats["method"] = "watch"
+            failure = self._watch_operation(op_name, op_ns, deadline, stats)
+        except WatchUnavailable:
+            stats["method"] = "poll"
+            failure = self._poll_operation(op_name, op_ns, deadline, stats)
+        stats["wait_seconds"] = round(time.monotonic() - started, 3)
+
+        if failure is not None:
+            return ansible_fail(failure)
+        return True
+
+    def _watch_operation (self, op_name, op_ns, deadline, stats):
+        """Wait for operation `op_name` to complete, using a Kubernetes watch.
+
+        Return None on success, or an error message. Raise
+        `WatchUnavailable` if watching is not an option (in which case
+        the caller should poll instead.)
+        """
+        try:
+            from kubernetes.client.rest import ApiException
+            from kubernetes.dynamic.exceptions import ResourceNotFoundError
+        except ImportError as e:
+            raise WatchUnavailable(str(e))
+
+        dynamic_client = get_kubernetes_client(self.kubeconfig_path).client
+        try:
+            operations = dynamic_client.resources.get(
+                api_version="catalog.cattle.io/v1", kind="Operation")
+        except ResourceNotFoundError as e:
+            raise WatchUnavailable(str(e))
+
+        while True:
+            operation = operations.get(name=op_name, namespace=op_ns).to_dict()
+            stats["polls"] += 1
+            done, failure = operation_outcome(operation)
+            if done or failure:
+                return failure
+
+            resource_version = operation["metadata"]["resourceVersion"]
+            try:
+                while time.monotonic() < deadline:
+                    # `Watch.stream` raises `ApiException` on ERROR
+                    # events, rather than yielding them.
+                    for event in dynamic_client.watch(
+                            operations, namespace=op_ns, name=op_name,
+                            resource_version=resource_version,
+                            timeout=max(1, int(deadline - time.monotonic()))):
+                        stats["events"] += 1
+                        operation = event["raw_object"]
+                        resource_version = operation["metadata"]["resourceVersion"]
+                        done, failure = operation_outcome(operation)
+                        if done or failure:
+                            return failure
+                    # Server-side watch timeout; resume watching
+            except ApiException as e:
+                if e.status == 410:
+                    # 410 Gone i.e. `resource_version` is too old;
+                    # start over with a fresh GET, and watch again.
+                    continue
+                elif e.status in (403, 405):
+                    # Not allowed to watch (or not supported)
+                    raise WatchUnavailable(str(e))
+                else:
+                    raise
+
+            return self._timeout_message(op_name, op_ns)
+
+    def _poll_operation (self, op_name, op_ns, deadline, stats):
+        """Like `_watch_operation`, but with polling (and jittered exponential backoff)."""
+        delay = 0.5
+        while True:
             operation = self.ansible_api.jinja.lookup(
                 "epfl_si.k8s.k8s", api_version="catalog.cattle.io/v1", kind="Operation",
                 resource_name=op_name, namespace=op_ns)
+            stats["polls"] += 1
+            done, failure = operation_outcome(operation)
+            if done or failure:
+                return failure
 
-            for condition in operation["status"]["conditions"]:
-                if condition["status"] == "False" and condition["type"] == "Reconciling":
-                    operation_done = True
-                if condition["status"] == "True" and condition["type"] == "Stalled":
-                    message = condition["message"]
-                    last_update_time = condition["lastUpdateTime"]
-                    return ansible_fail(f"Operation {op_name} in namespace {op_ns} stalled: {message} (at {last_update_time})")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._timeout_message(op_name, op_ns)
+            time.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+            delay = min(delay * 2, 15)
+
+    def _timeout_message (self, op_name, op_ns):
+        return f"Timed out waiting for operation {op_name} in namespace {op_ns} (timeout: {self.timeout})"
 
     def _do_uninstall_helm_chart (self):
-        self.change(
-            "epfl_si.k8s.k8s_api_call",
-            {
-                "kubeconfig": self.kubeconfig,
-                "method": "POST",
-                "uri": f"/v1/catalog.cattle.io.apps/{self.install_namespace}/{self.chart_name}?action=uninstall",
-                "body": {}
-            }
-        )
+        self.result["changed"] = True
+        if self.ansible_api.check_mode.is_active:
+            return None
+
+        self._forget_app()
+        return self._steve.uninstall_app(self.install_namespace, self.chart_name,
+                                         {"timeout": self.timeout})
 
     @cached_property
     def _helm_info (self):
@@ -169,10 +446,13 @@ class RancherHelmChartAction (ActionBase, RancherActionMixin):
         else:
             return current_chart_name_and_version == f'{self.chart_name}-{required_version}'
 
+    @cached_property
+    def kubeconfig_path (self):
+        return self.ansible_api.jinja.expand("{{ ansible_k8s_kubeconfig }}")
+
     @property
     def kubeconfig (self):
-        with open(self.ansible_api.jinja.expand("{{ ansible_k8s_kubeconfig }}")) as f:
-            return yaml.safe_load(f)
+        return load_kubeconfig(self.kubeconfig_path)
 
     def _make_k8s_ns_definition (self, namespace_name):
         return {
@@ -192,11 +472,88 @@ class RancherHelmChartAction (ActionBase, RancherActionMixin):
 
     @property
     def _helm_chart_is_installed (self):
-        return len(self.ansible_api.jinja.lookup(
-            'epfl_si.k8s.k8s',
-            api_version='catalog.cattle.io/v1',
-            kind='App',
-            resource_name=self.chart_name,
-            namespace=self.install_namespace)) > 0
+        return self._current_app is not None
+
+    @cached_property
+    def _current_app (self):
+        return self._snapshot.get(
+            "App", self.install_namespace, self.chart_name,
+            lambda: self._steve.get_app(self.install_namespace, self.chart_name))
+
+    def _forget_app (self):
+        self._snapshot.invalidate("App", self.install_namespace, self.chart_name)
+        self.__dict__.pop("_current_app", None)
+
+    @property
+    def _snapshot (self):
+        return ClusterSnapshot.of(self.kubeconfig_path)
+
+class WatchUnavailable (Exception):
+    """Raised by `_watch_operation` when it can't watch, and polling should be used instead."""
+
+
+def desired_state_digest (**desired_state):
+    """A canonical hash of what we want installed."""
+    canonical = json.dumps(desired_state, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def dependency_waves (charts):
+    """Sort `charts` into a list of “waves” (lists of charts).
+
+    Each chart only `depends_on` (the `release` names of) charts in
+    earlier waves.
+    """
+    remaining = {chart["release"]: chart for chart in charts}
+    for chart in charts:
+        unknown = set(chart.get("depends_on", [])) - set(remaining)
+        if unknown:
+            raise ValueError("Chart %s depends on unknown chart(s): %s"
+                             % (chart["release"], ", ".join(sorted(unknown))))
+
+    waves = []
+    done = set()
+    while remaining:
+        wave = [chart for chart in remaining.values()
+                if set(chart.get("depends_on", [])) <= done]
+        if not wave:
+            raise ValueError("Circular dependency among charts: %s"
+                             % ", ".join(sorted(remaining)))
+        waves.append(wave)
+        for chart in wave:
+            done.add(chart["release"])
+            del remaining[chart["release"]]
+    return waves
+
+
+def operation_outcome (operation):
+    """Examine a `catalog.cattle.io/v1` `Operation` object.
+
+    Return a (done, failure) tuple, where `failure` is either None or
+    an error message.
+    """
+    done = False
+    for condition in (operation.get("status") or {}).get("conditions") or []:
+        if condition["status"] == "True" and condition["type"] == "Stalled":
+            metadata = operation["metadata"]
+            message = condition["message"]
+            last_update_time = condition["lastUpdateTime"]
+            return True, (f"Operation {metadata['name']} in namespace {metadata['namespace']} "
+                          f"stalled: {message} (at {last_update_time})")
+        if condition["status"] == "False" and condition["type"] == "Reconciling":
+            done = True
+    return done, None
+
+
+def parse_go_duration (duration):
+    """Parse a Helm-style duration such as `600s` or `1h30m` into a number of seconds."""
+    if isinstance(duration, (int, float)):
+        return duration
+    units = dict(h=3600, m=60, s=1, ms=0.001)
+    parsed = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", duration)
+    if not parsed:
+        raise ValueError(f"Invalid duration: {duration}")
+    return sum(float(qty) * units[unit] for qty, unit in parsed)
+
 
 ActionModule = RancherHelmChartAction
@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
+import time
 
 from ansible.errors import AnsibleUndefinedVariable
 from ansible.plugins.action import ActionBase
@@ -6,8 +8,9 @@ from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import
 from ansible_collections.kubernetes.core.plugins.module_utils.k8s.client import get_api_client
 from ansible_collections.kubernetes.core.plugins.module_utils.k8s import exceptions as k8s_exceptions
 
+from ansible_collections.epfl_si.rancher.plugins.module_utils.kubeconfig import save_kubeconfig
 from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherManager
-from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin, reports_rancher_http_stats
 
 class RancherLoginAction (ActionBase, RancherActionMixin):
     """Download a Kubeconfig file from the rancher back-end.
@@ -16,15 +19,64 @@ class RancherLoginAction (ActionBase, RancherActionMixin):
     ../modules/rancher_login.py which only exists for documentation
     purposes.
     """
+    @reports_rancher_http_stats
     @AnsibleActions.run_method
     def run (self, args, ansible_api):
         self._init_rancher(ansible_api=ansible_api)
 
+        if "cluster_names" in args:
+            return self._login_many(
+                args["cluster_names"],
+                dest=args.get("dest"),
+                concurrency=int(args.get("concurrency", 8)))
+
         explicit_cluster_name = args.get('cluster_name')
         if explicit_cluster_name:
             self.rancher_cluster_name = explicit_cluster_name
 
-        self.result["kubeconfig"] = self.rancher_manager.get_cluster_by_name(self.rancher_cluster_name).download_kubeconfig()
+        kubeconfig = self.rancher_manager.get_cluster_by_name(self.rancher_cluster_name).download_kubeconfig()
+        self.result["kubeconfig"] = kubeconfig
+        if not self.ansible_api.check_mode.is_active:
+            self.result["expires_at"] = self.rancher_manager.get_kubeconfig_expires_at(kubeconfig)
+        return self.result
+
+    def _login_many (self, cluster_names, dest, concurrency):
+        clusters = self.rancher_manager.get_clusters_by_name(cluster_names)
+
+        def login_one (cluster_name):
+            cluster = clusters[cluster_name]
+            outcome = {}
+            started = time.monotonic()
+            try:
+                if cluster is None:
+                    raise ValueError(f"No such cluster: {cluster_name}")
+                if dest:
+                    outcome["path"] = dest.format(cluster_name=cluster_name,
+                                                  cluster_id=cluster.id)
+                if not self.ansible_api.check_mode.is_active:
+                    kubeconfig = cluster.download_kubeconfig()
+                    outcome["expires_at"] = self.rancher_manager.get_kubeconfig_expires_at(kubeconfig)
+                    if dest:
+                        save_kubeconfig(outcome["path"], kubeconfig,
+                                        expires_at=outcome["expires_at"])
+                    else:
+                        outcome["kubeconfig"] = kubeconfig
+            except Exception as e:
+                outcome["error"] = str(e)
+            outcome["elapsed"] = round(time.monotonic() - started, 3)
+            return outcome
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = dict(zip(cluster_names,
+                                executor.map(login_one, cluster_names)))
+
+        self.result["clusters"] = outcomes
+        if dest and any("error" not in o for o in outcomes.values()):
+            self.result["changed"] = True
+        failed = sorted(name for name, o in outcomes.items() if "error" in o)
+        if failed:
+            self.result["failed"] = True
+            self.result["msg"] = "Failed to log into cluster(s): %s" % ", ".join(failed)
         return self.result
 
 ActionModule = RancherLoginAction
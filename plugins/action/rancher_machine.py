@@ -1,10 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
 from ansible.plugins.action import ActionBase
 from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import AnsibleActions
 
-from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin, reports_rancher_http_stats
 
 
 class RancherMachineAction (ActionBase, RancherActionMixin):
+    """Delete Rancher-managed machines.
+
+    See Ansible-level documentation in ../modules/rancher_machine.py
+    which only exists for documentation purposes.
+    """
+    @reports_rancher_http_stats
     @AnsibleActions.run_method
     def run (self, args, ansible_api):
         super(RancherMachineAction, self).run(args, ansible_api)
@@ -13,7 +23,23 @@ class RancherMachineAction (ActionBase, RancherActionMixin):
         if args["state"] != "absent":
             raise NotImplementedError("Can only delete machines for now :-P")
 
-        the_machine = self.rancher_manager.get_cluster_by_name(self.rancher_cluster_name).get_machine_by_name(args["name"])
+        if ("name" in args) == ("names" in args):
+            raise ValueError("Exactly one of `name` or `names` must be set")
+
+        max_etcd_deletions = int(args.get("max_etcd_deletions", 1))
+        if max_etcd_deletions < 1:
+            raise ValueError("`max_etcd_deletions` must be at least 1")
+
+        cluster = self.rancher_manager.get_cluster_by_name(self.rancher_cluster_name)
+
+        if "names" in args:
+            return self._delete_many(
+                cluster, args["names"],
+                concurrency=int(args.get("concurrency", 8)),
+                max_etcd_deletions=max_etcd_deletions,
+                etcd_wait_timeout=int(args.get("etcd_wait_timeout", 600)))
+
+        the_machine = cluster.get_machine_by_name(args["name"])
 
         if not the_machine.exists():
             return {}
@@ -21,5 +47,43 @@ class RancherMachineAction (ActionBase, RancherActionMixin):
         the_machine.delete()
         return dict(changed=True)
 
+    def _delete_many (self, cluster, names, concurrency, max_etcd_deletions, etcd_wait_timeout):
+        machines = cluster.get_machines_by_name(names)
+        # Deleting etcd / control plane machines is done at most
+        # `max_etcd_deletions` at a time, and each waits for Rancher to
+        # be done removing the machine before letting the next one in,
+        # so as not to wreck the etcd quorum.
+        etcd_slots = threading.BoundedSemaphore(max_etcd_deletions)
+
+        def delete_one (machine):
+            outcome = dict(existed=machine.exists(), deleted=False)
+            started = time.monotonic()
+            try:
+                if machine.exists():
+                    if machine.is_etcd_or_controlplane:
+                        with etcd_slots:
+                            machine.delete()
+                            machine.wait_deleted(timeout=etcd_wait_timeout)
+                    else:
+                        machine.delete()
+                    outcome["deleted"] = True
+            except Exception as e:
+                outcome["error"] = str(e)
+            outcome["elapsed"] = round(time.monotonic() - started, 3)
+            return outcome
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = dict(zip(machines.keys(),
+                                executor.map(delete_one, machines.values())))
+
+        self.result["machines"] = outcomes
+        if any(o["deleted"] for o in outcomes.values()):
+            self.result["changed"] = True
+        failed = sorted(name for name, o in outcomes.items() if "error" in o)
+        if failed:
+            self.result["failed"] = True
+            self.result["msg"] = "Failed to delete machine(s): %s" % ", ".join(failed)
+        return self.result
+
 
 ActionModule = RancherMachineAction
@@ -3,7 +3,7 @@ from functools import cached_property
 from ansible.plugins.action import ActionBase
 from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import AnsibleActions
 
-from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_actions import RancherActionMixin, reports_rancher_http_stats
 
 _not_set = object()
 
@@ -14,6 +14,7 @@ class RancherRegistrationAction (ActionBase, RancherActionMixin):
     ../modules/rke2_registration.py which only exists for documentation
     purposes.
     """
+    @reports_rancher_http_stats
     @AnsibleActions.run_method
     def run (self, args, ansible_api):
         super(RancherRegistrationAction, self).run(args, ansible_api)
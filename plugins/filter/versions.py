@@ -1,41 +1,150 @@
-"""Look up latest versions of RKE2 assets."""
+"""Look up latest versions of RKE2 assets.
 
-import ssl
+RKE2 release channels (e.g.
+https://update.rke2.io/v1-release/channels/stable) answer with a
+redirect to the current release. Templating
+`get_rke2_current_version` for many hosts would therefore make as many
+HTTPS round-trips, all alike; instead, answers are remembered for
+`cache_ttl` seconds in memory and, if `cache_file` is set, on disk
+(so that all Ansible worker processes, and subsequent runs, benefit).
+Connections to the channel server are kept alive between calls.
+"""
+
+import functools
 import http.client
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
 from requests.utils import DEFAULT_CA_BUNDLE_PATH
 
 from urllib.parse import urlparse
 
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import TTLCache
+
 
 class HTTPStatusError (Exception):
     pass
 
 
-def get_location_header (url):
+@functools.lru_cache(maxsize=None)
+def _ssl_context ():
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
     context.check_hostname = True
     context.verify_mode = ssl.CERT_REQUIRED
     context.load_verify_locations(DEFAULT_CA_BUNDLE_PATH)
+    return context
+
+
+class _ConnectionPool:
+    """Keep-alive HTTPS connections, one per (host, port)."""
+
+    def __init__ (self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def request (self, method, host, port, path):
+        """Perform an HTTP request; return `(status, headers)`.
 
+        If the server closed the kept-alive connection in the
+        meantime, reconnect and try again once.
+        """
+        for attempt in (1, 2):
+            conn = self._checkout(host, port)
+            try:
+                conn.request(method, path)
+                response = conn.getresponse()
+                # Drain the body, so that the connection may be reused
+                response.read()
+            except (http.client.RemoteDisconnected, ConnectionError,
+                    http.client.CannotSendRequest, http.client.BadStatusLine):
+                conn.close()
+                if attempt == 2:
+                    raise
+                continue
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(host, port, conn)
+            return response.status, response.headers
+
+    def _checkout (self, host, port):
+        with self._lock:
+            conn = self._connections.pop((host, port), None)
+        if conn is None:
+            conn = http.client.HTTPSConnection(host, port=port, context=_ssl_context())
+        return conn
+
+    def _checkin (self, host, port, conn):
+        with self._lock:
+            previous = self._connections.get((host, port))
+            self._connections[(host, port)] = conn
+        if previous is not None:
+            previous.close()
+
+
+_pool = _ConnectionPool()
+
+
+def get_location_header (url):
     parsed = urlparse(url)
     port = parsed.port or 443
     path = parsed.path or "/"
     if parsed.query:
         path += "?" + parsed.query
 
-    conn = http.client.HTTPSConnection(
-        parsed.hostname,
-        port=port,
-        context=context)
-
-    conn.request("GET", path)
-    response = conn.getresponse()
-
-    status = response.status
+    status, headers = _pool.request("GET", parsed.hostname, port, path)
     if status < 300 or status > 399:
         raise HTTPStatusError("Unexpected status %d at %s" % (status, url))
 
-    return response.getheader("Location")
+    return headers.get("Location")
+
+
+class _VersionFileCache:
+    """A JSON file that maps channel URLs to (version, expiry time) pairs."""
+
+    def __init__ (self, path):
+        self.path = os.path.expanduser(path)
+
+    def get (self, url):
+        entry = self._load().get(url)
+        if entry is None or entry["expires"] <= time.time():
+            return None
+        return entry["version"]
+
+    def set (self, url, version, ttl):
+        entries = self._load()
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if v["expires"] > now}
+        entries[url] = dict(version=version, expires=now + ttl)
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".rke2-versions-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load (self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+_versions = TTLCache(ttl=3600)
+
 
 class FilterModule(object):
     def filters(self):
@@ -43,7 +152,28 @@ class FilterModule(object):
             'get_rke2_current_version': self.get_rke2_current_version
         }
 
-    def get_rke2_current_version(self, channel_url):
-        """Obtain the current (latest) version in an RKE2 release channel."""
+    def get_rke2_current_version(self, channel_url, cache_ttl=3600, cache_file=None):
+        """Obtain the current (latest) version in an RKE2 release channel.
+
+        The answer is remembered for `cache_ttl` seconds (0 to
+        disable); in memory, and also in `cache_file` if set.
+        """
+        if cache_ttl > 0:
+            version = _versions.get(channel_url)
+            if version is not None:
+                return version
+            if cache_file:
+                version = _VersionFileCache(cache_file).get(channel_url)
+                if version is not None:
+                    _versions.set(channel_url, version, ttl=cache_ttl)
+                    return version
+
         location = get_location_header(channel_url)
-        return location.split("/")[-1]
+        version = location.split("/")[-1]
+
+        if cache_ttl > 0:
+            _versions.set(channel_url, version, ttl=cache_ttl)
+            if cache_file:
+                _VersionFileCache(cache_file).set(channel_url, version, cache_ttl)
+
+        return version
@@ -0,0 +1,241 @@
+DOCUMENTATION = '''
+name: rancher
+short_description: Rancher-managed clusters and their nodes, as an Ansible inventory
+description:
+- Obtain the list of the Kubernetes nodes of all the clusters (or some
+  of them) that a Rancher manager knows about, from the Rancher API.
+
+- Each node becomes a host, whose name is the Kubernetes node name.
+  Hosts are put into one group per cluster (named after the cluster's
+  display name, as seen in the Rancher UI), and into the C(etcd),
+  C(controlplane) and C(worker) groups according to their RKE2 roles.
+  Use host patterns such as C(mycluster:&controlplane) to combine
+  both.
+
+- Hosts get the same variables as the ones that the
+  C(epfl_si.rancher.rke2_node) role expects, i.e.
+  C(ansible_rancher_url), C(ansible_rancher_cluster_name),
+  C(rancher_rke2_node_name), C(rancher_rke2_is_worker),
+  C(rancher_rke2_is_controlplane) and C(rancher_rke2_has_etcd); as
+  well as C(ansible_host) (set to the node's IP address, as Rancher
+  knows it), C(rancher_node_state), and, for clusters that Rancher
+  provisioned itself, C(rancher_machine_name) and
+  C(rancher_machine_phase).
+
+- The inventory configuration file must be named C(rancher.yml) or
+  C(rancher.yaml), or end with C(.rancher.yml) or C(.rancher.yaml).
+
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+
+options:
+  plugin:
+    description: Token that ensures this is a source file for this plugin.
+    required: true
+    choices: ['epfl_si.rancher.rancher']
+  url:
+    type: str
+    required: true
+    description: The base URL of the Rancher manager.
+    env:
+      - name: RANCHER_URL
+  api_key:
+    type: str
+    required: true
+    description: A Rancher bearer token, of the form C(token-xxxxx:yyyyyy).
+    env:
+      - name: RANCHER_TOKEN
+  clusters:
+    type: list
+    elements: str
+    default: []
+    description: The display names of the clusters to list the nodes of.
+      The default is to list all clusters, including C(local).
+  validate_certs:
+    type: bool
+    default: true
+    description: Set to false to skip TLS validation of the Rancher
+      server. This B(is insecure).
+  ca_cert:
+    type: str
+    description: The CA certificate to validate the Rancher TLS server,
+      as a PEM string.
+  concurrency:
+    type: int
+    default: 8
+    description: How many clusters to fetch the nodes and machines of,
+      in parallel.
+  page_size:
+    type: int
+    default: 100
+    description: How many objects to ask for in each HTTP GET to the
+      Rancher API.
+  http_pool_size:
+    type: int
+    description: The maximum number of keep-alive connections to the
+      Rancher manager. The default is the same as for the action
+      plugins (see C(ansible_rancher_http_pool_size) in
+      C(ansible-doc epfl_si.rancher.rancher_login)).
+  http_timeout:
+    type: float
+    description: Timeout for each Rancher API call, in seconds.
+  http_retries:
+    type: int
+    description: How many times to retry Rancher API calls that fail
+      with HTTP 429 or 5xx.
+
+version_added: 0.14.0
+'''
+
+EXAMPLES = '''
+# rancher.yml
+plugin: epfl_si.rancher.rancher
+url: https://rancher.example.com
+clusters:
+  - mycluster
+cache: true
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: ~/.cache/ansible/inventory
+cache_timeout: 600
+keyed_groups:
+  - key: rancher_node_state
+    prefix: state
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import (
+    RancherAPI, RancherManager)
+
+
+class InventoryModule (BaseInventoryPlugin, Constructable, Cacheable):
+    NAME = 'epfl_si.rancher.rancher'
+
+    def verify_file (self, path):
+        basename = os.path.basename(path)
+        return (super().verify_file(path) and
+                (basename in ('rancher.yml', 'rancher.yaml') or
+                 basename.endswith(('.rancher.yml', '.rancher.yaml'))))
+
+    def parse (self, inventory, loader, path, cache=True):
+        super().parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        use_cache = self.get_option('cache') and cache
+        update_cache = self.get_option('cache') and not cache
+
+        clusters = None
+        if use_cache:
+            try:
+                clusters = self._cache[cache_key]
+            except KeyError:
+                update_cache = True
+
+        if clusters is None:
+            clusters = self._fetch_clusters()
+
+        if update_cache:
+            self._cache[cache_key] = clusters
+
+        self._populate(clusters)
+
+    @property
+    def _http_options (self):
+        options = dict(verify=self.get_option('validate_certs'))
+        for option, setting in (('ca_cert', 'ca_cert'),
+                                ('pool_size', 'http_pool_size'),
+                                ('timeout', 'http_timeout'),
+                                ('retries', 'http_retries')):
+            value = self.get_option(setting)
+            if value is not None:
+                options[option] = value
+        return options
+
+    def _fetch_clusters (self):
+        """Return a list of clusters (as JSON-serializable dicts), with their nodes."""
+        manager = RancherManager(self.get_option('url'), self.get_option('api_key'),
+                                 http_options=self._http_options)
+
+        wanted = set(self.get_option('clusters'))
+        clusters = [c for c in manager.all_clusters(page_size=self.get_option('page_size'))
+                    if not wanted or c.name in wanted]
+
+        missing = wanted - set(c.name for c in clusters)
+        if missing:
+            raise AnsibleParserError(
+                f"No such cluster(s) in Rancher: {', '.join(sorted(missing))}")
+
+        with ThreadPoolExecutor(max_workers=self.get_option('concurrency')) as executor:
+            return list(executor.map(self._fetch_cluster, clusters))
+
+    def _fetch_cluster (self, cluster):
+        page_size = self.get_option('page_size')
+
+        machines = {}
+        try:
+            for machine in cluster.kubernetes_sig_cluster_machines(page_size=page_size):
+                if machine.node_name:
+                    machines[machine.node_name] = machine
+        except RancherAPI.Error as e:
+            # Clusters that Rancher doesn't provision itself (e.g.
+            # `local`) may have no Fleet namespace at all.
+            if e.status_code != 404:
+                raise
+
+        nodes = []
+        for node in cluster.nodes(page_size=page_size):
+            machine = machines.get(node.node_name)
+            nodes.append(dict(
+                name=node.node_name,
+                ip_address=node.ip_address,
+                state=node.state,
+                is_etcd=node.is_etcd or bool(machine and machine.is_etcd),
+                is_controlplane=node.is_controlplane or bool(machine and machine.is_controlplane),
+                is_worker=node.is_worker or bool(machine and machine.is_worker),
+                machine_name=machine.name if machine else None,
+                machine_phase=machine.phase if machine else None))
+
+        return dict(name=cluster.name, id=cluster.id, nodes=nodes)
+
+    def _populate (self, clusters):
+        strict = self.get_option('strict')
+        url = self.get_option('url')
+
+        for role in ('etcd', 'controlplane', 'worker'):
+            self.inventory.add_group(role)
+
+        for cluster in clusters:
+            cluster_group = self.inventory.add_group(self._sanitize_group_name(cluster["name"]))
+            for node in cluster["nodes"]:
+                host = self.inventory.add_host(node["name"], group=cluster_group)
+
+                hostvars = dict(
+                    ansible_rancher_url=url,
+                    ansible_rancher_cluster_name=cluster["name"],
+                    rancher_cluster_id=cluster["id"],
+                    rancher_rke2_node_name=node["name"],
+                    rancher_rke2_has_etcd=node["is_etcd"],
+                    rancher_rke2_is_controlplane=node["is_controlplane"],
+                    rancher_rke2_is_worker=node["is_worker"],
+                    rancher_node_state=node["state"])
+                if node["ip_address"]:
+                    hostvars["ansible_host"] = node["ip_address"]
+                if node["machine_name"]:
+                    hostvars["rancher_machine_name"] = node["machine_name"]
+                    hostvars["rancher_machine_phase"] = node["machine_phase"]
+                for var, value in hostvars.items():
+                    self.inventory.set_variable(host, var, value)
+
+                for role in ('etcd', 'controlplane', 'worker'):
+                    if node[f"is_{role}"]:
+                        self.inventory.add_child(role, host)
+
+                self._set_composite_vars(self.get_option('compose'), hostvars, host, strict=strict)
+                self._add_host_to_composed_groups(self.get_option('groups'), hostvars, host, strict=strict)
+                self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, host, strict=strict)
@@ -1,30 +1,112 @@
+import json
+
 from ansible.plugins.lookup import LookupBase
 from ansible_collections.epfl_si.k8s.plugins.lookup.k8s import LookupModule as K8sLookup
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import TTLCache
+
+# Listings of Rancher resources, indexed, keyed by kind and by
+# connection parameters. Shared by all Rancher lookups in the same
+# process, for `cache_ttl` seconds (see “Process-wide state” in
+# rancher_model.py).
+_indexes = TTLCache(ttl=300)
+
 
 class RancherLookupBase (LookupBase):
+    """Base class for Rancher lookups.
+
+    Besides the parameters of the `epfl_si.k8s.k8s` lookup (e.g.
+    `kubeconfig`), subclasses' `run` method accepts the following
+    keyword arguments, which are handled by `_init_rancher`:
+
+    - `cache_ttl`: how long (in seconds) to remember listings of
+      clusters and projects; default 300
+
+    - `refresh`: if true, ignore any remembered listing and fetch
+      anew
+    """
     def _init_rancher (self, variables, kwargs):
+        kwargs = dict(kwargs)
+        self.__refresh = kwargs.pop("refresh", False)
+        self.__cache_ttl = int(kwargs.pop("cache_ttl", 300))
+        self.__refreshed = set()
         self.__variables = variables
         self.__kwargs = kwargs
 
-    def __get_custom_resource (self, kind, api_version):
+    def __get_custom_resource (self, kind, api_version, **kwargs):
         return K8sLookup(self._loader, self._templar).run(
             [],
             variables=self.__variables,
             api_version=api_version, kind=kind,
-            **self.__kwargs)
+            **dict(self.__kwargs, **kwargs))
+
+    def __get_index (self, kind, api_version, index_class, **kwargs):
+        key = (kind, json.dumps(dict(self.__kwargs, **kwargs), sort_keys=True, default=str),
+               (self.__variables or {}).get("ansible_k8s_kubeconfig"))
+
+        if not (self.__refresh and kind not in self.__refreshed):
+            index = _indexes.get(key)
+            if index is not None:
+                return index
+
+        index = index_class(self.__get_custom_resource(kind, api_version, **kwargs))
+        _indexes.set(key, index, ttl=self.__cache_ttl)
+        self.__refreshed.add(kind)
+        return index
 
     @property
-    def _all_clusters (self):
-        return self.__get_custom_resource('cluster', 'management.cattle.io/v3')
+    def _clusters (self):
+        return self.__get_index('cluster', 'management.cattle.io/v3', _ClusterIndex)
+
+    def _projects_of_cluster (self, cluster_id):
+        """Fetch only the projects of cluster `cluster_id`, indexed by display name.
+
+        This works because projects live in the namespace named
+        after their cluster's ID (which is also their
+        `spec.clusterName`).
+        """
+        return self.__get_index('project', 'management.cattle.io/v3', _ProjectIndex,
+                                namespace=cluster_id)
 
     @property
-    def _all_projects (self):
-        return self.__get_custom_resource('project', 'management.cattle.io/v3')
+    def _all_clusters (self):
+        return self._clusters.all
 
     @property
     def _rancher_cluster_id (self):
-        [cluster_id] = (
-            c["metadata"]["name"] for c in self._all_clusters
-            if c["spec"]["displayName"] == self.__variables["ansible_rancher_cluster_name"])
+        [cluster] = self._clusters.by_display_name.get(
+            self.__variables["ansible_rancher_cluster_name"], [])
+        cluster_id = cluster["metadata"]["name"]
         assert cluster_id is not None
         return cluster_id
+
+
+class _Index:
+    def __init__ (self, objects):
+        self.all = objects
+
+    @staticmethod
+    def _group_by (objects, key):
+        grouped = {}
+        for obj in objects:
+            grouped.setdefault(key(obj), []).append(obj)
+        return grouped
+
+
+class _ClusterIndex (_Index):
+    """`Cluster.management.cattle.io` objects, indexed by their various names."""
+    def __init__ (self, clusters):
+        super().__init__(clusters)
+        self.by_name = {c["metadata"]["name"]: c for c in clusters}
+        self.by_display_name = self._group_by(
+            clusters, lambda c: c["spec"]["displayName"])
+        self.by_management_display_name = self._group_by(
+            clusters, lambda c: (c["metadata"].get("annotations") or {}).get(
+                "provisioning.cattle.io/management-cluster-display-name"))
+
+
+class _ProjectIndex (_Index):
+    """`Project.management.cattle.io` objects, indexed by display name."""
+    def __init__ (self, projects):
+        super().__init__(projects)
+        self.by_display_name = self._group_by(
+            projects, lambda p: p["spec"]["displayName"])
@@ -13,6 +13,34 @@ description:
   “human” handle instead, like for instance the `spec.displayName` of
   the `Cluster` object (as is visible from the Rancher UI).
 
+options:
+  _terms:
+    type: list
+    elements: str
+    version_added: 0.14.0
+    description: The names of several clusters, as seen in the Rancher UI.
+      The return value is the list of the corresponding C(Cluster) objects,
+      in the same order.
+  display_name:
+    type: str
+    description: The name of the cluster, as seen in the Rancher UI. Ignored
+      if any terms are passed.
+  refresh:
+    type: bool
+    default: false
+    version_added: 0.14.0
+    description: The list of clusters is fetched once, and remembered
+      for O(cache_ttl) seconds by all Rancher lookups that run in the
+      same Ansible worker process, i.e. within one task for one host
+      (e.g. across the iterations of a C(loop), or several lookups in
+      the same task's arguments). It is B(not) shared across tasks or
+      hosts. Set this to true to fetch it anew.
+  cache_ttl:
+    type: int
+    default: 300
+    version_added: 0.14.0
+    description: How long to remember the list of clusters, in seconds.
+
 version_added: 0.10.0
 '''
 
@@ -32,14 +60,28 @@ EXAMPLES = '''
                     display_name="MyCluster").metadata.name }}
         spec:
           displayName: "My App"
+
+# Look up several clusters at once
+- ansible.builtin.debug:
+    msg: >-
+      {{ query("epfl_si.rancher.rancher_cluster", "MyCluster", "MyOtherCluster")
+         | map(attribute="metadata.name") }}
 '''
 
+from ansible.errors import AnsibleLookupError
 from ansible_collections.epfl_si.rancher.plugins.lookup._rancher_lookup_base import RancherLookupBase
 
 class LookupModule (RancherLookupBase):
     def run (self, terms, variables=None, display_name=None, **kwargs):
         self._init_rancher(variables, kwargs)
 
-        [result] = [c for c in self._all_clusters
-                    if c["metadata"].get("annotations").get("provisioning.cattle.io/management-cluster-display-name") == display_name]
-        return [result]
+        by_display_name = self._clusters.by_management_display_name
+
+        def find_one (name):
+            matched = by_display_name.get(name, [])
+            if len(matched) != 1:
+                raise AnsibleLookupError(
+                    f"Expected exactly one cluster named {name}, found {len(matched)}")
+            return matched[0]
+
+        return [find_one(name) for name in (terms or [display_name])]
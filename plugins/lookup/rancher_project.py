@@ -5,6 +5,36 @@ description:
 - This lookup plugin searches for C(Project.management.cattle.io) objects belonging to
   the current cluster (the one that the C(ansible_rancher_cluster_name) variable points to).
 
+options:
+  _terms:
+    type: list
+    elements: str
+    version_added: 0.14.0
+    description: The names of several projects, as seen in the Rancher UI.
+      The return value is the list of the corresponding C(Project) objects,
+      in the same order (exactly one per term). If no terms are passed, the
+      behavior depends on O(display_name).
+  display_name:
+    type: str
+    description: The name of the project, as seen in the Rancher UI. If
+      unset, return all the cluster's projects.
+  refresh:
+    type: bool
+    default: false
+    version_added: 0.14.0
+    description: The lists of clusters and projects are fetched once, and
+      remembered for O(cache_ttl) seconds by all Rancher lookups that
+      run in the same Ansible worker process, i.e. within one task
+      for one host (e.g. across the iterations of a C(loop), or
+      several lookups in the same task's arguments). They are B(not)
+      shared across tasks or hosts. Set this to true to fetch them
+      anew.
+  cache_ttl:
+    type: int
+    default: 300
+    version_added: 0.14.0
+    description: How long to remember the lists of clusters and projects,
+      in seconds.
 
 version_added: 0.7.0
 '''
@@ -25,19 +55,34 @@ EXAMPLES = '''
       {{ lookup("epfl_si.rancher.rancher_project",
                 kubeconfig="/where/the/rancher/master/credentials/are",
                 display_name="System") }}
+
+# Look up several projects at once
+- ansible.builtin.debug:
+    msg: >-
+      {{ query("epfl_si.rancher.rancher_project", "System", "Default",
+               kubeconfig="/where/the/rancher/master/credentials/are")
+         | map(attribute="metadata.name") }}
 '''
 
+from ansible.errors import AnsibleLookupError
 from ansible_collections.epfl_si.rancher.plugins.lookup._rancher_lookup_base import RancherLookupBase
 
 class LookupModule (RancherLookupBase):
     def run (self, terms, variables=None, display_name=None, **kwargs):
         self._init_rancher(variables, kwargs)
 
-        projects = [p for p in self._all_projects
-                    if p["spec"]["clusterName"] == self._rancher_cluster_id]
+        projects = self._projects_of_cluster(self._rancher_cluster_id)
 
-        if display_name is not None:
-            projects = [p for p in projects
-                        if p["spec"]["displayName"] == display_name]
+        if terms:
+            def find_one (name):
+                matched = projects.by_display_name.get(name, [])
+                if len(matched) != 1:
+                    raise AnsibleLookupError(
+                        f"Expected exactly one project named {name}, found {len(matched)}")
+                return matched[0]
 
-        return projects
+            return [find_one(name) for name in terms]
+        elif display_name is not None:
+            return list(projects.by_display_name.get(display_name, []))
+        else:
+            return list(projects.all)
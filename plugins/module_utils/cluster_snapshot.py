@@ -0,0 +1,69 @@
+"""Per-cluster memory of the Kubernetes objects that this collection's action plugins look at.
+
+For instance, `epfl_si.rancher.rancher_helm_chart` with `owned: true`
+namespaces calls `epfl_si.rancher.namespace` as a sub-action, which
+wants to know whether the namespace exists and which project
+`kube-system` belongs to; and then it wants to know whether the `App`
+exists. In a loop, or with the `charts:` form, the same questions get
+asked again and again. `ClusterSnapshot` remembers the answers, until
+one of the same action plugins changes them.
+
+Objects changed by anything else than this collection's action plugins
+are not noticed; which is the price to pay.
+"""
+
+import threading
+
+from ansible_collections.epfl_si.rancher.plugins.module_utils.kubeconfig import kubeconfig_identity
+
+
+class ClusterSnapshot:
+    """A cache of Kubernetes objects of one cluster, keyed by kind, namespace and name.
+
+    Obtain instances with the `of` class method.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def of (cls, kubeconfig_path):
+        """Return the (process-wide) snapshot of the cluster that `kubeconfig_path` points to.
+
+        Snapshots are keyed by the resolved path of the kubeconfig
+        file, as well as its modification time and size; so that
+        rewriting the file starts a new snapshot.
+        """
+        key = kubeconfig_identity(kubeconfig_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls()
+            return cls._instances[key]
+
+    def __init__ (self):
+        self._objects = {}
+        self._lock = threading.Lock()
+        self.stats = dict(hits=0, misses=0)
+
+    def get (self, kind, namespace, name, fetch):
+        """Return the object, calling `fetch()` to obtain it on a cache miss.
+
+        Whatever `fetch()` returns (including None or an empty list,
+        for “does not exist”) is remembered.
+        """
+        key = (kind, namespace, name)
+        with self._lock:
+            if key in self._objects:
+                self.stats["hits"] += 1
+                return self._objects[key]
+            self.stats["misses"] += 1
+
+        obj = fetch()
+        with self._lock:
+            self._objects[key] = obj
+        return obj
+
+    def invalidate (self, kind, namespace, name):
+        """Forget about an object, e.g. because we just changed it."""
+        with self._lock:
+            self._objects.pop((kind, namespace, name), None)
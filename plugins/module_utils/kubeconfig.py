@@ -0,0 +1,165 @@
+"""Controller-side cache of kubeconfig files, and of the API clients made out of them.
+
+Also, writing kubeconfig files along with the expiry date of their
+credentials.
+
+Within one process, the same kubeconfig file is typically used over
+and over. The functions in this module parse it only once, and
+construct API clients for it only once, for as long as the file
+doesn't change on disk (as told by its modification time and size).
+See “Process-wide state” in rancher_model.py for how far that goes.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+import yaml
+
+from ansible_collections.kubernetes.core.plugins.module_utils.k8s.client import get_api_client
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherAPI
+
+
+_parsed = {}
+_clients = {}
+_lock = threading.Lock()
+
+
+def load_kubeconfig (path):
+    """Return the parsed contents of the kubeconfig file at `path`.
+
+    The returned dict is shared with other callers, and therefore
+    must not be modified.
+    """
+    path, stamp = _stat(path)
+    with _lock:
+        cached = _parsed.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(path) as f:
+        config = yaml.safe_load(f)
+    with _lock:
+        _parsed[path] = (stamp, config)
+    return config
+
+
+def get_kubernetes_client (path):
+    """Return a `kubernetes.core` API client for the kubeconfig file at `path`.
+
+    The underlying dynamic client (with its API discovery cache) is
+    available as the `.client` attribute of the return value.
+    """
+    path, stamp = _stat(path)
+    with _lock:
+        cached = _clients.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    client = get_api_client(kubeconfig=load_kubeconfig(path))
+    with _lock:
+        _clients[path] = (stamp, client)
+    return client
+
+
+class KubernetesClientAPI:
+    """Same interface as `RancherAPI.call`, over a `kubernetes.core` API client.
+
+    This works with any kind of kubeconfig credentials (client
+    certificates, `exec` plugins etc.), unlike `RancherAPI` which
+    only does bearer tokens. Errors are raised as `RancherAPI.Error`.
+
+    Requests go straight to the underlying `kubernetes.client.ApiClient`
+    (rather than the dynamic client's `request` method, which insists
+    on turning responses into `ResourceInstance`s), and return the
+    decoded JSON body as is.
+    """
+    def __init__ (self, path):
+        self.api_client = get_kubernetes_client(path).client.client
+
+    def call (self, method, uri, body=None, query_params=None, content_type=None):
+        from kubernetes.client.rest import ApiException
+
+        header_params = {"Accept": "application/json"}
+        if body is not None:
+            header_params["Content-Type"] = content_type or "application/json"
+        try:
+            response = self.api_client.call_api(
+                uri, method,
+                query_params=list((query_params or {}).items()),
+                header_params=header_params,
+                body=body,
+                auth_settings=["BearerToken"],
+                _return_http_data_only=True,
+                _preload_content=False)
+        except ApiException as e:
+            raise RancherAPI.Error(e.body or e.reason, status_code=e.status)
+
+        data = response.data
+        return json.loads(data) if data else None
+
+
+def kubeconfig_identity (path):
+    """Return a hashable identity for the kubeconfig file at `path`.
+
+    It is made of the absolute path, modification time and size of
+    the file, and its current context; meaning that it changes
+    whenever the file is rewritten (e.g. with fresh credentials for
+    another cluster).
+    """
+    config = load_kubeconfig(path)
+    path, stamp = _stat(path)
+    return (path, stamp, (config or {}).get("current-context"))
+
+
+def save_kubeconfig (path, content, expires_at=None):
+    """Write `content` (a YAML string) to the kubeconfig file at `path`, atomically.
+
+    The file is private to its owner (mode 0600). `expires_at`, if
+    set, is the expiry date of the credentials therein, and is
+    recorded for `load_kubeconfig_expiry` to return.
+    """
+    _write_atomically(path, content)
+    path, stamp = _stat(path)
+    _write_atomically(_expiry_path(path),
+                      json.dumps(dict(stamp=list(stamp), expires_at=expires_at)))
+
+
+def load_kubeconfig_expiry (path):
+    """Return the expiry date recorded by `save_kubeconfig` for `path`, or None.
+
+    The record is disregarded if the kubeconfig file changed since.
+    """
+    path, stamp = _stat(path)
+    try:
+        with open(_expiry_path(path)) as f:
+            record = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if tuple(record.get("stamp") or ()) != stamp:
+        return None
+    return record.get("expires_at")
+
+
+def _expiry_path (path):
+    return f"{path}.expiry.json"
+
+
+def _write_atomically (path, content):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".kubeconfig-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _stat (path):
+    path = os.path.abspath(os.path.expanduser(path))
+    st = os.stat(path)
+    return path, (st.st_mtime_ns, st.st_size)
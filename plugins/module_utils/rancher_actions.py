@@ -1,7 +1,7 @@
 """Common material for Rancher-related action plugins."""
 
 from abc import ABC, abstractmethod
-from functools import cached_property
+from functools import cached_property, wraps
 import getpass
 import os
 import socket
@@ -10,12 +10,31 @@ from urllib.parse import urlparse
 from ansible_collections.epfl_si.actions.plugins.module_utils.subactions import Subaction
 from ansible_collections.epfl_si.actions.plugins.module_utils.ansible_api import AnsibleActions
 
-from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherManager
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherManager, RancherManagerRegistry
+from ansible_collections.epfl_si.rancher.plugins.module_utils.token_cache import BearerTokenCache
 
 
 _not_set = object()
 
 
+def reports_rancher_http_stats (run_method):
+    """Decorator for the `run` method of action plugins that use `RancherActionMixin`.
+
+    If the `ansible_rancher_http_stats` variable is true, add the
+    statistics of the Rancher HTTP connection pool and manager
+    registry to the result, as `rancher_http`. Apply it on top of
+    `@AnsibleActions.run_method`.
+    """
+    @wraps(run_method)
+    def run (self, *args, **kwargs):
+        result = run_method(self, *args, **kwargs)
+        stats = self._rancher_http_stats()
+        if stats is not None and isinstance(result, dict):
+            result["rancher_http"] = stats
+        return result
+    return run
+
+
 class RancherActionMixin(ABC):
     """Things that are useful to more than one action plugin.
 
@@ -58,15 +77,40 @@ class RancherActionMixin(ABC):
                 changed=True,
                 bearer_token="MOCK:TOKEN_FOR_CHECK_MODE")
             self.result.update(result)
-        else:
-            result = self.change_over_ssh(
-                self._obtain_token_action_name,
-                dict(cluster_name=self._expand_var('ansible_rancher_cluster_name'),
-                     impersonate=self._expand_var('ansible_rancher_username', 'admin'),
-                     stem=self.token_stem))
-            self.result.update(result)
+            return result['bearer_token']
+
+        token_cache = self._token_cache
+        if token_cache is not None:
+            bearer_token = token_cache.get(self.rancher_base_url, self.token_stem)
+            if bearer_token is not None:
+                return bearer_token
+
+        token_args = dict(
+            cluster_name=self._expand_var('ansible_rancher_cluster_name'),
+            impersonate=self._expand_var('ansible_rancher_username', 'admin'),
+            stem=self.token_stem)
+        validity = self._expand_var('ansible_rancher_token_validity', None)
+        if validity is not None:
+            token_args['validity'] = validity
+        if self._expand_var('ansible_rancher_token_gc', False):
+            token_args['gc'] = True
+
+        result = self.change_over_ssh(self._obtain_token_action_name, token_args)
+        self.result.update(result)
+        if token_cache is not None:
+            token_cache.put(self.rancher_base_url, self.token_stem,
+                            result['bearer_token'], result.get('expires_at'))
         return result['bearer_token']
 
+    @property
+    def _token_cache (self):
+        path = self._expand_var('ansible_rancher_token_cache', None)
+        if not path:
+            return None
+        return BearerTokenCache(
+            path,
+            margin=int(self._expand_var('ansible_rancher_token_cache_margin', 30)))
+
     @property
     def token_stem (self):
         stem = self._expand_var(
@@ -103,11 +147,66 @@ class RancherActionMixin(ABC):
     def rancher_cluster_name (self, cluster_name):
         self._explicitly_set_rancher_cluster_name = cluster_name
 
+    _http_option_vars = dict(
+        pool_size=('ansible_rancher_http_pool_size', int),
+        timeout=('ansible_rancher_http_timeout', float),
+        retries=('ansible_rancher_http_retries', int),
+        backoff_factor=('ansible_rancher_http_backoff_factor', float))
+
+    @property
+    def rancher_http_options (self):
+        """The keyword arguments for `RancherHTTPSession`, as set from Ansible variables."""
+        options = {}
+        for option, (var_name, convert) in self._http_option_vars.items():
+            value = self._expand_var(var_name, None)
+            if value is not None:
+                options[option] = convert(value)
+        return options
+
     @cached_property
     def rancher_manager (self):
-        return RancherManager(
-            base_url=self.rancher_base_url,
-            api_key=self._obtain_token())
+        manager = RancherManagerRegistry.get(
+            self._rancher_manager_key,
+            lambda: RancherManager(
+                base_url=self.rancher_base_url,
+                api_key=self._obtain_token(),
+                http_options=self.rancher_http_options))
+        # The manager may outlive us; make sure that token renewals
+        # happen in the context of the current task and host:
+        manager.api.renew_api_key = self._renew_token
+        return manager
+
+    @property
+    def _rancher_manager_key (self):
+        return (self.rancher_base_url,
+                self._expand_var('ansible_rancher_cluster_name'),
+                self._expand_var('ansible_rancher_username', 'admin'),
+                self.token_stem,
+                self.ansible_api.check_mode.is_active)
+
+    def _rancher_http_stats (self):
+        """Return the `rancher_http` result (see `reports_rancher_http_stats`), or None."""
+        if "rancher_manager" not in self.__dict__:
+            return None  # Didn't talk to Rancher at all
+        if not self._expand_var('ansible_rancher_http_stats', False):
+            return None
+        return dict(connections=self.rancher_manager.api.connection_stats,
+                    managers=RancherManagerRegistry.stats())
+
+    def _renew_token (self):
+        """Obtain a new token, after the Rancher manager rejected the current one with a 401.
+
+        Should that fail, evict the manager from the registry, so that
+        the next task starts afresh.
+        """
+        token_cache = self._token_cache
+        if token_cache is not None:
+            token_cache.evict(self.rancher_base_url, self.token_stem)
+        try:
+            return self._obtain_token()
+        except Exception:
+            RancherManagerRegistry.invalidate(self._rancher_manager_key)
+            raise
 
     def query (self, task_name, task_args):
         return self._subaction.query(task_name, task_args)
@@ -31,24 +31,84 @@ affectionately called (I'm not making this up) Steve and Norman.
   operations declaratively laid out in these objects' `spec:`; and
   then wait for some out-of-process operator to update their
   `status:`.
+
+Process-wide state
+------------------
+
+Some classes in this module (as well as in kubeconfig.py,
+cluster_snapshot.py and the Rancher lookups) keep state at the process
+level, so as to spare API calls, TLS handshakes and such. Mind that
+Ansible forks one worker process per task and host; so that state is
+shared across the iterations of a `loop:`, with sub-actions and among
+the threads of bulk modes (e.g. `names:`, `charts:`), but *not* across
+tasks or hosts. Whatever must outlive the worker process has to be
+kept on disk, as token_cache.py does.
 """
 
+import atexit
+import base64
 from functools import cached_property
-
-from requests import request
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import yaml
 
 class RancherManager:
     """Model class for the Rancher manager.
 
-    An instance represents a connection to the “main” Rancher manager backend."""
-    def __init__ (self, base_url, api_key):
+    An instance represents a connection to the “main” Rancher manager backend.
+
+    `http_options`, if set, is a dict of keyword arguments for the
+    `RancherHTTPSession` constructor (pool size, timeouts, retries).
+
+    Clusters looked up by name, and their registration tokens, are
+    remembered for `cluster_index_ttl` seconds.
+    """
+    def __init__ (self, base_url, api_key, http_options=None, cluster_index_ttl=300):
         self.base_url = base_url
         self.api_key = api_key
-        self.api = RancherAPI(base_url, api_key)
+        self.api = RancherAPI(base_url, api_key, http_options=http_options)
+        self.cluster_index = TTLCache(cluster_index_ttl)
+        self.registration_token_index = TTLCache(cluster_index_ttl)
 
     def get_cluster_by_name (self, name):
         return RancherManagedCluster.by_name(self, name)
 
+    def get_clusters_by_name (self, names):
+        return RancherManagedCluster.by_names(self, names)
+
+    def get_kubeconfig_expires_at (self, kubeconfig):
+        """Return the `expiresAt` of the Norman token in `kubeconfig`, or None.
+
+        `kubeconfig` is either parsed, or a YAML string (such as what
+        `download_kubeconfig` returns). None is returned for tokens
+        that never expire, as well as when the token cannot be found.
+        """
+        if isinstance(kubeconfig, str):
+            kubeconfig = yaml.safe_load(kubeconfig)
+        _, user = _kubeconfig_current_cluster_and_user(kubeconfig)
+        token = user.get("token")
+        if not token:
+            return None
+        token_name = token.split(":", 1)[0]
+        try:
+            return self.api.call('GET', f'/v3/tokens/{token_name}').get('expiresAt') or None
+        except RancherAPI.Error as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def all_clusters (self, page_size=None):
+        """Iterate over all the clusters that this Rancher manager manages."""
+        return RancherManagedCluster.all(self, page_size=page_size)
+
 
 class RancherAPI:
     """An object-oriented interface to Rancher's “Steve” and “Norman" APIs.
@@ -59,56 +119,332 @@ class RancherAPI:
     named `local` in the GUI), under URLs typically starting with
     `/v1/`; and the “Norman” API where URLs typically start with
     `/v3/`.
+
+    All HTTP traffic goes through a `RancherHTTPSession`, which is
+    shared with every other `RancherAPI` instance that has the same
+    base URL and credentials.
     """
-    def __init__ (self, base_url, api_key):
+    def __init__ (self, base_url, api_key, http_options=None):
         self.base_url = base_url
         self.api_key = api_key
-
-    def call (self, method, uri, body=None, query_params=None):
+        self.http_options = http_options or {}
+        self.http = RancherHTTPSession.get(base_url, api_key,
+                                           **self.http_options)
+        # Set this to a function that returns a fresh API key, to have
+        # `call` retry once after a 401 (Unauthorized) error:
+        self.renew_api_key = None
+        # Serializes renewals, as `call` may run in several threads at
+        # once (e.g. from the `names:` form of
+        # `epfl_si.rancher.rancher_machine`):
+        self._renew_lock = threading.Lock()
+
+    def call (self, method, uri, body=None, query_params=None, content_type=None):
         opt_args = {}
-        if body:
+        if body is not None and content_type is not None:
+            # E.g. `application/merge-patch+json` for PATCH
+            opt_args['data'] = json.dumps(body)
+            opt_args['headers'] = {'Content-Type': content_type}
+        elif body is not None:
             opt_args['json'] = body
         if query_params:
             opt_args['params'] = query_params
 
-        response = request(method,
-                           self.base_url + uri,
-                           headers={
-                               'Authorization': 'Bearer %s' % self.api_key
-                           },
-                           **opt_args)
+        api_key = self.api_key
+        response = self._request(method, uri, api_key=api_key, **opt_args)
+        if response.status_code == 401 and self.renew_api_key is not None:
+            with self._renew_lock:
+                # Another thread may have renewed it in the meantime:
+                if self.api_key == api_key:
+                    self._set_api_key(self.renew_api_key())
+            response = self._request(method, uri, **opt_args)
 
         if response.status_code in (200, 201):
             return response.json()
+        elif response.status_code == 401:
+            raise self.Unauthorized(response.text, status_code=401)
         else:
-            raise self.Error(response.text)
+            raise self.Error(response.text, status_code=response.status_code)
+
+    def _request (self, method, uri, headers={}, api_key=None, **kwargs):
+        return self.http.request(method,
+                                 self.base_url + uri,
+                                 headers=dict(headers,
+                                              Authorization='Bearer %s' % (api_key or self.api_key)),
+                                 **kwargs)
+
+    def _set_api_key (self, api_key):
+        # Don't close the old session, as other threads may still be
+        # using it; it will be garbage-collected once they are done.
+        RancherHTTPSession.forget(self.base_url, self.api_key, close=False)
+        self.api_key = api_key
+        self.http = RancherHTTPSession.get(self.base_url, api_key,
+                                           **self.http_options)
+
+    @property
+    def connection_stats (self):
+        return self.http.connection_stats
 
     class Error (Exception):
+        def __init__ (self, message, status_code=None):
+            super().__init__(message)
+            self.status_code = status_code
+
+    class Unauthorized (Error):
         pass
 
 
+class _RancherRetry (Retry):
+    """Like `Retry`, except that POSTs are retried too, but only on 429."""
+    def is_retry (self, method, status_code, has_retry_after=False):
+        if method.upper() == 'POST' and status_code == 429:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class RancherHTTPSession:
+    """A pooled, keep-alive `requests.Session` to one Rancher back-end.
+
+    Instances are meant to be obtained with the `get` class method,
+    which hands out the same instance to all callers that pass the
+    same base URL and API key, for as long as the current process
+    lives (see “Process-wide state” in the module docstring). This
+    spares us one TCP connect and TLS handshake per API call.
+
+    Only idempotent requests (GET, PUT, DELETE etc.) are retried on 5xx
+    errors; POSTs (e.g. `?action=generateKubeconfig`) are not, as
+    Rancher may already have acted upon them. Everyone gets retried
+    on 429 (Too Many Requests), honoring `Retry-After`.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get (cls, base_url, api_key, **kwargs):
+        """Return the shared instance for `base_url` and `api_key`, creating it if needed.
+
+        `kwargs` are passed to the constructor, and therefore only
+        matter on the first call for a given (`base_url`, `api_key`)
+        pair.
+        """
+        key = (base_url, api_key)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(**kwargs)
+            return cls._instances[key]
+
+    @classmethod
+    def forget (cls, base_url, api_key, close=True):
+        """Drop (and, if `close` is true, close) the shared instance for `base_url` and `api_key`, if any."""
+        with cls._instances_lock:
+            instance = cls._instances.pop((base_url, api_key), None)
+        if instance is not None and close:
+            instance.session.close()
+
+    def __init__ (self, pool_size=10, timeout=(10, 120), retries=3, backoff_factor=0.5,
+                  verify=True, ca_cert=None):
+        """Constructor.
+
+        `pool_size` is the maximum number of concurrent keep-alive
+        connections; `timeout` is either a number of seconds, or a
+        (connect, read) tuple as per `requests`; `retries` and
+        `backoff_factor` are passed to `urllib3.util.retry.Retry`.
+        `verify` set to False disables TLS server authentication;
+        `ca_cert`, if set, is the PEM-encoded CA certificate to
+        authenticate the server with.
+        """
+        self.timeout = timeout
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=_RancherRetry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(429, 500, 502, 503, 504),
+                raise_on_status=False))
+        self.session = Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.verify = verify
+        if ca_cert and verify:
+            self.session.verify = self._save_ca_cert(ca_cert)
+
+    @staticmethod
+    def _save_ca_cert (ca_cert):
+        # `requests` wants a file name.
+        fd, path = tempfile.mkstemp(prefix="rancher-ca-", suffix=".pem")
+        with os.fdopen(fd, "w") as f:
+            f.write(ca_cert)
+        atexit.register(os.unlink, path)
+        return path
+
+    def request (self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    @property
+    def connection_stats (self):
+        """Return a dict with keys `opened` and `reused`.
+
+        `opened` counts the TCP (+ TLS) connections that were
+        established to the Rancher back-end, and `reused` counts the
+        requests that rode an already-open, keep-alive connection.
+        """
+        opened = requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests += pool.num_requests
+        return dict(opened=opened, reused=max(requests - opened, 0))
+
+
+class TTLCache:
+    """A thread-safe dict-like, whose entries expire after `ttl` seconds."""
+
+    def __init__ (self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get (self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set (self, key, value, ttl=None):
+        """Remember `value` for `ttl` seconds (or `self.ttl` if not set)."""
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate (self, key=None):
+        """Forget about `key`, or about everything if `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class RancherManagerRegistry:
+    """Process-wide registry of `RancherManager` instances.
+
+    Keys are opaque tuples chosen by the caller (see
+    `RancherActionMixin._rancher_manager_key`), so that e.g. all hosts
+    in all tasks that share the same Rancher URL, cluster name,
+    impersonated user and token stem, also share the same
+    `RancherManager` — and therefore the same token and HTTP pool.
+    See “Process-wide state” in the module docstring for what
+    “process-wide” means here.
+    """
+
+    _managers = {}
+    _lock = threading.RLock()
+    _stats = dict(hits=0, misses=0, invalidations=0)
+
+    @classmethod
+    def get (cls, key, factory):
+        """Return the `RancherManager` registered under `key`.
+
+        If there is none, call `factory()` to make one, and register it.
+        """
+        with cls._lock:
+            if key in cls._managers:
+                cls._stats["hits"] += 1
+            else:
+                cls._stats["misses"] += 1
+                cls._managers[key] = factory()
+            return cls._managers[key]
+
+    @classmethod
+    def invalidate (cls, key):
+        with cls._lock:
+            if cls._managers.pop(key, None) is not None:
+                cls._stats["invalidations"] += 1
+
+    @classmethod
+    def stats (cls):
+        with cls._lock:
+            return dict(cls._stats, size=len(cls._managers))
+
+
 class RancherManagedCluster:
     """Model for one of the clusters that Rancher manages (including itself)."""
 
+    @classmethod
+    def all (cls, manager, page_size=None):
+        """Iterate over all clusters, fetching them one page at a time."""
+        for api_object in RancherManagedClusterAPI.all(manager.api, page_size=page_size):
+            yield cls(manager, api_object)
+
     @classmethod
     def by_name (cls, manager, cluster_name):
         """Find and return a cluster by its display name.
 
         If no such cluster exists, return None.
 
+        Positive results are remembered in `manager.cluster_index`.
         """
 
-        matched = [c for c in RancherManagedClusterAPI.all(manager.api)
-                   if c.name == cluster_name]
+        cached = manager.cluster_index.get(cluster_name)
+        if cached is not None:
+            return cls(manager, cached)
+
+        matched = list(RancherManagedClusterAPI.all(manager.api, name=cluster_name))
         if len(matched) == 0:
             return None
         elif len(matched) == 1:
+            manager.cluster_index.set(cluster_name, matched[0])
             return cls(manager, matched[0])
         else:
             raise ValueError(
                 f'GET {RancherManagedClusterAPI.base_uri}: '
                 f'{len(matched)} cluster(s) found with name {cluster_name}; expected at most one.')
 
+    @classmethod
+    def by_names (cls, manager, cluster_names):
+        """Like `by_name`, for many clusters at once.
+
+        Return a dict keyed by name, whose values are None for clusters
+        that don't exist. Clusters not already in
+        `manager.cluster_index` are resolved out of a single listing.
+        """
+        found = {}
+        for name in cluster_names:
+            cached = manager.cluster_index.get(name)
+            if cached is not None:
+                found[name] = [cached]
+
+        missing = set(cluster_names) - set(found)
+        if missing:
+            for api_object in RancherManagedClusterAPI.all(manager.api):
+                if api_object.name in missing:
+                    found.setdefault(api_object.name, []).append(api_object)
+
+        clusters = {}
+        for name in cluster_names:
+            matched = found.get(name, [])
+            if len(matched) == 0:
+                clusters[name] = None
+            elif len(matched) == 1:
+                manager.cluster_index.set(name, matched[0])
+                clusters[name] = cls(manager, matched[0])
+            else:
+                raise ValueError(
+                    f'GET {RancherManagedClusterAPI.base_uri}: '
+                    f'{len(matched)} cluster(s) found with name {name}; expected at most one.')
+        return clusters
+
     def __init__ (self, manager, api_object):
         self.manager = manager
         self.api_object = api_object
@@ -117,6 +453,10 @@ class RancherManagedCluster:
     def id (self):
         return self.api_object.id
 
+    @property
+    def name (self):
+        return self.api_object.name
+
     def download_kubeconfig (self):
         """Perform the same API call as the “Download Kubeconfig” button in the Rancher UI.
 
@@ -128,30 +468,216 @@ class RancherManagedCluster:
     @property
     def registration_tokens (self):
         api = self.manager.api
+        index = self.manager.registration_token_index
         cluster_id = self.id
 
         class RegistrationTokens:
             def first (self):
                 """Raises IndexError if there are currently no valid tokens."""
-                my_toks = [tok for tok in RancherClusterRegistrationTokensAPI.all(api)
-                           if tok.cluster_id == cluster_id]
-                return my_toks[0].data
+                my_tok = index.get(cluster_id)
+                if my_tok is None:
+                    my_tok = RancherClusterRegistrationTokensAPI.first(
+                        api, lambda tok: tok.cluster_id == cluster_id,
+                        clusterId=cluster_id)
+                    if my_tok is None:
+                        raise IndexError(f"No registration tokens for cluster {cluster_id}")
+                    index.set(cluster_id, my_tok)
+                return my_tok.data
 
             def make_more (self):
                 RancherClusterRegistrationTokensAPI.renew(api, cluster_id)
+                index.invalidate(cluster_id)
 
         return RegistrationTokens()
 
+    @property
+    def fleet_namespace (self):
+        return self.api_object.fleet_namespace
+
     def get_machine_by_name (self, machine_name):
         return RancherManagedClusterMachine(self, machine_name)
 
+    def get_machines_by_name (self, machine_names):
+        """Like `get_machine_by_name`, for many machines at once.
+
+        Return a dict of `RancherManagedClusterMachine` instances keyed
+        by name, all resolved out of a single listing.
+        """
+        matching = {name: [] for name in machine_names}
+        for k in self.kubernetes_sig_cluster_machines():
+            if k.node_name in matching:
+                matching[k.node_name].append(k)
+
+        machines = {}
+        for name, candidates in matching.items():
+            machine = RancherManagedClusterMachine(self, name)
+            machine._kubernetes_sig_cluster_api = machine._pick(candidates)
+            machines[name] = machine
+        return machines
+
+    def nodes (self, page_size=None):
+        """Iterate over this cluster's `RancherNodeAPI` objects."""
+        return RancherNodeAPI.all(self.manager.api, page_size=page_size, clusterId=self.id)
+
+    def kubernetes_sig_cluster_machines (self, page_size=None):
+        """Iterate over this cluster's `KubernetesSigClusterMachineAPI` objects (and no one else's)."""
+        return KubernetesSigClusterMachineAPI.all(
+            self.manager.api, page_size=page_size,
+            collection_uri=f'{KubernetesSigClusterMachineAPI.base_uri}/{self.fleet_namespace}',
+            labelSelector=f'cluster.x-k8s.io/cluster-name={self.api_object.name}')
+
+
+class RancherClusterSteveAPI:
+    """The “Steve” API of one downstream cluster, as proxied by the Rancher manager.
+
+    Unlike `RancherAPI` proper, which works with the credentials of
+    the Rancher manager, instances are constructed from a downstream
+    cluster's kubeconfig (such as what `download_kubeconfig` returns),
+    whose server URL looks like
+    `https://rancher.example.com/k8s/clusters/c-m-abcd1234`.
+    """
+
+    @classmethod
+    def is_rancher_proxied (cls, kubeconfig):
+        """True iff `kubeconfig` points at the Rancher manager's proxy for the cluster.
+
+        Steve routes (`/v1/catalog.cattle.io.*` etc.) only exist
+        there, and not on the downstream cluster's own API server
+        (e.g. with an “authorized cluster endpoint” kubeconfig).
+        """
+        cluster, _ = _kubeconfig_current_cluster_and_user(kubeconfig)
+        return "/k8s/clusters/" in urlsplit(cluster["server"]).path
+
+    @classmethod
+    def has_bearer_token (cls, kubeconfig):
+        """True iff `from_kubeconfig` can make an instance out of `kubeconfig`."""
+        _, user = _kubeconfig_current_cluster_and_user(kubeconfig)
+        return "token" in user
+
+    @classmethod
+    def from_kubeconfig (cls, kubeconfig, http_options=None):
+        """Make an instance out of a parsed kubeconfig, using its current context.
+
+        Only bearer-token kubeconfigs (such as the ones Rancher makes)
+        are supported; for the others, see `KubernetesClientAPI` in
+        kubeconfig.py.
+        """
+        cluster, user = _kubeconfig_current_cluster_and_user(kubeconfig)
+        if "token" not in user:
+            raise ValueError("Only bearer-token kubeconfigs (as made by Rancher) are supported")
+
+        http_options = dict(http_options or {})
+        if cluster.get("insecure-skip-tls-verify"):
+            http_options["verify"] = False
+        elif "certificate-authority-data" in cluster:
+            http_options["ca_cert"] = base64.b64decode(
+                cluster["certificate-authority-data"]).decode("ascii")
+
+        return cls(RancherAPI(cluster["server"], user["token"],
+                              http_options=http_options))
+
+    def __init__ (self, api):
+        self.api = api
+
+    def chart_action (self, repository, action, body):
+        """Perform `action` (“install” or “upgrade”) with Helm charts from `repository`.
+
+        `repository` is the name of a `ClusterRepo` object. Return the
+        response, of type `chartActionOutput`, which points to the
+        `Operation` object to watch for completion.
+        """
+        return self.api.call(
+            'POST', f'/v1/catalog.cattle.io.clusterrepos/{repository}',
+            query_params=dict(action=action), body=body)
+
+    def get_app (self, namespace, name):
+        """Return the `catalog.cattle.io/v1` `App` object, or None if it doesn't exist."""
+        try:
+            return self.api.call('GET', f'/v1/catalog.cattle.io.apps/{namespace}/{name}')
+        except RancherAPI.Error as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def annotate_app (self, namespace, name, annotations):
+        self.api.call(
+            'PATCH', f'/v1/catalog.cattle.io.apps/{namespace}/{name}',
+            body={"metadata": {"annotations": annotations}},
+            content_type='application/merge-patch+json')
+
+    def uninstall_app (self, namespace, name, body=None):
+        """Uninstall the `App` (i.e. the Helm release) `name` in `namespace`.
+
+        Return the response, like `chart_action` does.
+        """
+        return self.api.call(
+            'POST', f'/v1/catalog.cattle.io.apps/{namespace}/{name}',
+            query_params=dict(action='uninstall'), body=body or {})
+
+
+def _kubeconfig_current_cluster_and_user (kubeconfig):
+    def by_name (section, name):
+        [entry] = (e for e in kubeconfig[section] if e["name"] == name)
+        return entry
+
+    context = by_name("contexts", kubeconfig["current-context"])["context"]
+    return (by_name("clusters", context["cluster"])["cluster"],
+            by_name("users", context["user"])["user"])
+
 
 class _APIBase:
     """Base class for API objects whose instances are enumerated with HTTP GET."""
+
+    # How many objects to ask for per HTTP GET. Can be overridden in
+    # subclasses, or per call to `all` / `first`.
+    page_size = 100
+
     @classmethod
-    def all (cls, api):
-        return [cls(api, data)
-                for data in api.call('GET', cls.base_uri)['data']]
+    def all (cls, api, page_size=None, collection_uri=None, **filters):
+        """Iterate over the API objects, fetching them one page at a time.
+
+        Follows both Norman-style (`pagination.next` URL) and
+        Steve-style (`continue` token) pagination. `filters` are passed
+        as query parameters, which both APIs interpret as equality
+        constraints on the fields of the same name, e.g.
+        `all(api, name="my-cluster")`. `collection_uri`, if set,
+        overrides `base_uri` e.g. to list a single namespace.
+        """
+        query_params = dict(filters, limit=page_size or cls.page_size)
+        uri = collection_uri = collection_uri or cls.base_uri
+        while uri is not None:
+            page = api.call('GET', uri, query_params=query_params)
+            for data in page['data']:
+                yield cls(api, data)
+            uri, query_params = cls._next_page(api, page, collection_uri, query_params)
+
+    @classmethod
+    def first (cls, api, predicate=None, page_size=None, **filters):
+        """Return the first API object that matches `predicate`, or None.
+
+        Stops fetching pages as soon as a match is found.
+        """
+        for obj in cls.all(api, page_size=page_size, **filters):
+            if predicate is None or predicate(obj):
+                return obj
+        return None
+
+    @classmethod
+    def _next_page (cls, api, page, collection_uri, query_params):
+        next_url = (page.get('pagination') or {}).get('next')
+        if next_url:
+            # Norman passes all the query parameters back to us (as
+            # part of an absolute URL)
+            if next_url.startswith(api.base_url):
+                return next_url[len(api.base_url):], None
+            parsed = urlsplit(next_url)
+            return f'{parsed.path}?{parsed.query}', None
+
+        continue_token = page.get('continue')
+        if continue_token:
+            return collection_uri, dict(query_params, **{'continue': continue_token})
+
+        return None, None
 
     def __init__ (self, api, data):
         self.api = api
@@ -179,6 +705,11 @@ class RancherManagedClusterAPI (_APIBase):
     def uri (self):
         return f'{self.base_uri}/{self.id}'
 
+    @property
+    def fleet_namespace (self):
+        """The namespace in the Rancher manager cluster, where this cluster's CAPI objects live."""
+        return self.data.get('fleetWorkspaceName') or 'fleet-default'
+
     def download_kubeconfig (self):
         """Perform the same API call as the “Download Kubeconfig” button in the Rancher UI.
 
@@ -208,6 +739,44 @@ class RancherClusterRegistrationTokensAPI (_APIBase):
                   "clusterId": cluster_id})
         
 
+class RancherNodeAPI (_APIBase):
+    """The “Norman” API of the Kubernetes nodes of the clusters managed by Rancher.
+
+    Unlike `KubernetesSigClusterMachineAPI`, this also works for
+    clusters that Rancher didn't provision itself (e.g. imported ones).
+    """
+
+    base_uri = '/v3/nodes'
+
+    @property
+    def node_name (self):
+        return self.data.get('nodeName') or self.data.get('hostname')
+
+    @property
+    def cluster_id (self):
+        return self.data['clusterId']
+
+    @property
+    def ip_address (self):
+        return self.data.get('ipAddress')
+
+    @property
+    def state (self):
+        return self.data.get('state')
+
+    @property
+    def is_etcd (self):
+        return bool(self.data.get('etcd'))
+
+    @property
+    def is_controlplane (self):
+        return bool(self.data.get('controlPlane'))
+
+    @property
+    def is_worker (self):
+        return bool(self.data.get('worker'))
+
+
 class RancherManagedClusterMachine:
     """Model for a machine that Rancher manages."""
 
@@ -217,9 +786,10 @@ class RancherManagedClusterMachine:
 
     @cached_property
     def _kubernetes_sig_cluster_api (self):
-        matching = [k for k in KubernetesSigClusterMachineAPI.all(self.cluster.manager.api)
-                    if self.name == k.node_name]
+        return self._pick([k for k in self.cluster.kubernetes_sig_cluster_machines()
+                           if self.name == k.node_name])
 
+    def _pick (self, matching):
         if len(matching) == 0:
             return None
         elif len(matching) == 1:
@@ -231,17 +801,26 @@ class RancherManagedClusterMachine:
     def exists (self):
         return self._kubernetes_sig_cluster_api is not None
 
+    @property
+    def is_etcd_or_controlplane (self):
+        k = self._kubernetes_sig_cluster_api
+        return k is not None and (k.is_etcd or k.is_controlplane)
+
     def delete (self):
         self._kubernetes_sig_cluster_api.delete()
 
+    def wait_deleted (self, timeout=600, interval=5):
+        self._kubernetes_sig_cluster_api.wait_deleted(timeout=timeout, interval=interval)
+
 
 class KubernetesSigClusterMachineAPI (_APIBase):
     """The “Steve” API of `machine.cluster.x-k8s.io` objects in Rancher.
 
-    These are ordinary namespaced Kubernetes objects, wherein each
-    managed cluster is represented by a namespace in the Rancher
-    manager's API server, and the machines are objects of `Kind:
-    machine` in that namespace.
+    These are ordinary namespaced Kubernetes objects, which live in
+    the Fleet workspace namespace of the Rancher manager's API
+    server (typically `fleet-default`), and carry a
+    `cluster.x-k8s.io/cluster-name` label that points to their
+    cluster.
 
     """
     base_uri = '/v1/cluster.x-k8s.io.machines'
@@ -250,6 +829,30 @@ class KubernetesSigClusterMachineAPI (_APIBase):
     def node_name (self):
         return self.data.get("status", {}).get("nodeRef", {}).get("name")
 
+    @property
+    def is_etcd (self):
+        return self._role_label("etcd")
+
+    @property
+    def is_controlplane (self):
+        return self._role_label("control-plane")
+
+    @property
+    def is_worker (self):
+        return self._role_label("worker")
+
+    @property
+    def name (self):
+        return self.data["metadata"]["name"]
+
+    @property
+    def phase (self):
+        return self.data.get("status", {}).get("phase")
+
+    def _role_label (self, role):
+        labels = self.data.get("metadata", {}).get("labels") or {}
+        return labels.get(f"rke.cattle.io/{role}-role") == "true"
+
     @property
     def rest_url (self):
         metadata = self.data["metadata"]
@@ -257,3 +860,17 @@ class KubernetesSigClusterMachineAPI (_APIBase):
 
     def delete (self):
         self.api.call('DELETE', self.rest_url)
+
+    def wait_deleted (self, timeout=600, interval=5):
+        """Wait until the machine object is gone (i.e. Rancher is done draining and removing it)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.api.call('GET', self.rest_url)
+            except RancherAPI.Error as e:
+                if e.status_code == 404:
+                    return
+                raise
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'{self.rest_url} still exists after {timeout} seconds')
+            time.sleep(interval)
@@ -0,0 +1,101 @@
+"""On-disk cache of Rancher bearer tokens, on the Ansible controller.
+
+Obtaining a token is expensive (see
+../modules/_rancher_obtain_token.py: one ssh round-trip to the Rancher
+master, plus Kubernetes API calls there), whereas tokens typically
+remain valid for a while. `BearerTokenCache` remembers them across
+tasks, hosts and `ansible-playbook` runs, in a JSON file that only its
+owner can read (mode 0600).
+"""
+
+import datetime
+import json
+import os
+import tempfile
+
+from ansible_collections.epfl_si.rancher.plugins.module_utils.rancher_model import RancherAPI
+
+
+class BearerTokenCache:
+    """A JSON file that maps (Rancher URL, token stem) pairs to bearer tokens.
+
+    Each entry records the token's `expiresAt` (as returned by
+    `_rancher_obtain_token`), if any. Tokens are handed out without
+    any further check until `margin` seconds before they expire; tokens
+    with no known expiry date are checked with one `GET
+    /v3/tokens/<name>` Norman API call instead.
+    """
+
+    def __init__ (self, path, margin=30):
+        self.path = os.path.expanduser(path)
+        self.margin = datetime.timedelta(seconds=margin)
+
+    def get (self, base_url, stem):
+        """Return a cached, still-valid bearer token, or None."""
+        entry = self._load().get(self._key(base_url, stem))
+        if entry is None:
+            return None
+
+        bearer_token = entry["bearer_token"]
+        expires_at = parse_expires_at(entry.get("expires_at"))
+        if expires_at is None:
+            if not self._is_accepted(base_url, bearer_token):
+                self.evict(base_url, stem)
+                return None
+        elif expires_at - self.margin <= datetime.datetime.now(datetime.timezone.utc):
+            self.evict(base_url, stem)
+            return None
+
+        return bearer_token
+
+    def put (self, base_url, stem, bearer_token, expires_at=None):
+        entries = self._load()
+        entries[self._key(base_url, stem)] = dict(
+            bearer_token=bearer_token,
+            expires_at=expires_at)
+        self._save(entries)
+
+    def evict (self, base_url, stem):
+        entries = self._load()
+        if entries.pop(self._key(base_url, stem), None) is not None:
+            self._save(entries)
+
+    def _key (self, base_url, stem):
+        return "%s %s" % (base_url.rstrip("/"), stem)
+
+    def _is_accepted (self, base_url, bearer_token):
+        token_name = bearer_token.split(":", 1)[0]
+        try:
+            RancherAPI(base_url, bearer_token).call("GET", f"/v3/tokens/{token_name}")
+            return True
+        except RancherAPI.Error:
+            return False
+
+    def _load (self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save (self, entries):
+        # Write to a private temporary file in the same directory,
+        # then rename it over; so that concurrent Ansible workers never
+        # see a half-written file, and never a world-readable one.
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tokens-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def parse_expires_at (expires_at):
+    """Parse an `expiresAt` timestamp into an aware `datetime`, or return None if empty."""
+    if not expires_at:
+        return None
+    return datetime.datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
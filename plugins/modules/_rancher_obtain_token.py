@@ -1,12 +1,17 @@
+import base64
 import datetime
+from functools import cached_property
+import http.client
 import json
 import os
 import random
 import re
-import shutil
 import socket
+import ssl
 import string
-import subprocess
+import tempfile
+import time
+from urllib.parse import urlencode, urlparse
 
 from ansible.module_utils.basic import AnsibleModule
 
@@ -19,8 +24,9 @@ description:
       doesn't exist already; then returns the C(.token) value within.
   - This task is supposed to run over ssh on (one of) the Rancher master
       node(s).
-requirements:
-  - The C(kubectl) go binary must be installed on the remote Rancher server.
+  - This task talks directly to the Kubernetes API server of the Rancher
+      master, using the k3s or RKE2 admin kubeconfig file. It only
+      needs the Python standard library on the remote side.
 options:
   cluster_name:
     type: str
@@ -48,6 +54,27 @@ options:
         optionally followed by a time unit picked among 's', 'm'
         (or equivalently) 'min', 'h' or 'd'. 's' is the default time
         limit.
+  gc:
+    type: bool
+    default: false
+    version_added: 0.14.0
+    description:
+      - Whether to also delete expired tokens that previous runs minted
+        (i.e. those with the C(cattle.io/creator=Ansible) label).
+  gc_batch_size:
+    type: int
+    default: 100
+    version_added: 0.14.0
+    description:
+      - The maximum number of expired tokens to delete in one go, when
+        O(gc) is true.
+  api_timeout:
+    type: float
+    default: 30
+    version_added: 0.14.0
+    description:
+      - How long to wait for the Kubernetes API server of the Rancher
+        master, in seconds (per connection attempt and per read).
 """
 
 RETURN = r"""
@@ -56,11 +83,32 @@ bearer_token:
     type: str
     returned: always
     sample: 'koom7die5ohNgokoo6nung7ciesh7chae1Eici9fie5iDeinaere6r'
+expires_at:
+    description: The expiry date of the token (its C(expiresAt) field), or an
+      empty string if it never expires
+    type: str
+    returned: always
+    sample: '2026-10-17T18:41:53Z'
 changed:
     description: Whether a new token was created (as per Ansible standard)
     type: bool
     returned: always
     sample: True
+gc:
+    description: What the garbage collection of expired tokens did
+    type: dict
+    returned: when O(gc) is true
+    contains:
+      deleted:
+        description: How many expired tokens were deleted
+        type: int
+      more:
+        description: Whether O(gc_batch_size) was reached, i.e. there may
+          be more expired tokens left
+        type: bool
+      elapsed:
+        description: How long garbage collection took, in seconds
+        type: float
 """
 
 def parse_duration (duration):
@@ -89,97 +137,231 @@ def parse_duration (duration):
     return datetime.timedelta(seconds=multipliers[unit]*int(qty))
 
 
+def is_expired (token):
+    """True iff `token` (a parsed `Token.management.cattle.io`) can no longer be used."""
+    if token.get('expired'):
+        return True
+    expires_at = token.get('expiresAt')
+    if not expires_at:
+        return False
+    return (datetime.datetime.strptime(expires_at, "%Y-%m-%dT%H:%M:%SZ")
+            .replace(tzinfo=datetime.timezone.utc)
+            <= datetime.datetime.now(datetime.timezone.utc))
+
+
+class KubernetesAPIClient:
+    """A minimal client for the Kubernetes API server of the Rancher master.
+
+    Uses a single keep-alive HTTPS connection, and nothing but the
+    Python standard library (we cannot count on either `yaml`,
+    `requests` or `kubernetes` being installed on the Rancher master.)
+    """
+
+    # The admin kubeconfig files that k3s and RKE2 generate have
+    # exactly one cluster and one user, so we can get away with
+    # grepping them instead of parsing them as YAML:
+    _kubeconfig_keys = ('server',
+                        'certificate-authority', 'certificate-authority-data',
+                        'client-certificate', 'client-certificate-data',
+                        'client-key', 'client-key-data',
+                        'token')
+
+    def __init__ (self, kubeconfig_path, timeout=30):
+        config = self._read_kubeconfig(kubeconfig_path)
+        server = urlparse(config['server'])
+
+        context = ssl.create_default_context()
+        if 'certificate-authority-data' in config:
+            context.load_verify_locations(
+                cadata=base64.b64decode(config['certificate-authority-data']).decode('ascii'))
+        elif 'certificate-authority' in config:
+            context.load_verify_locations(cafile=config['certificate-authority'])
+
+        if 'client-certificate-data' in config:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                cert_path = os.path.join(tmpdir, 'cert.pem')
+                key_path = os.path.join(tmpdir, 'key.pem')
+                for path, key in ((cert_path, 'client-certificate-data'),
+                                  (key_path, 'client-key-data')):
+                    with open(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as f:
+                        f.write(base64.b64decode(config[key]))
+                context.load_cert_chain(cert_path, key_path)
+        elif 'client-certificate' in config:
+            context.load_cert_chain(config['client-certificate'], config['client-key'])
+
+        self.headers = {'Accept': 'application/json',
+                        'Content-Type': 'application/json'}
+        if 'token' in config:
+            self.headers['Authorization'] = 'Bearer %s' % config['token']
+
+        self.connection = http.client.HTTPSConnection(
+            server.hostname, port=server.port or 443, context=context,
+            timeout=timeout)
+
+    def _read_kubeconfig (self, path):
+        config = {}
+        with open(path) as f:
+            for line in f:
+                matched = re.match(r'^\s*([a-z-]+):\s*(.+?)\s*$', line)
+                if matched and matched.group(1) in self._kubeconfig_keys:
+                    config.setdefault(matched.group(1), matched.group(2).strip('"\''))
+        return config
+
+    def call (self, method, path, query_params=None, body=None):
+        if query_params:
+            path = path + '?' + urlencode(query_params)
+        self.connection.request(
+            method, path,
+            body=None if body is None else json.dumps(body),
+            headers=self.headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        if response.status not in (200, 201):
+            raise self.Error(response.status,
+                             "%s %s: HTTP %d: %s" % (method, path, response.status,
+                                                     payload.decode('utf-8', 'replace')))
+        return json.loads(payload)
+
+    def list (self, path, label_selector=None, page_size=100):
+        """Iterate over all objects of a collection, fetching them one page at a time."""
+        query_params = dict(limit=page_size)
+        if label_selector:
+            query_params['labelSelector'] = label_selector
+        while True:
+            page = self.call('GET', path, query_params=query_params)
+            yield from page['items']
+            continue_token = page.get('metadata', {}).get('continue')
+            if not continue_token:
+                return
+            query_params['continue'] = continue_token
+
+    class Error (Exception):
+        def __init__ (self, status, message):
+            super().__init__(message)
+            self.status = status
+
+
 class RancherObtainTokenModule:
     argspec = dict(
         cluster_name=dict(type='str', required=True),
         impersonate=dict(type='str', default='admin'),
         stem=dict(type='str', required=True),
-        validity=dict(type='str', default='2min'))
+        validity=dict(type='str', default='2min'),
+        gc=dict(type='bool', default=False),
+        gc_batch_size=dict(type='int', default=100),
+        api_timeout=dict(type='float', default=30))
 
     def __init__ (self):
         self.module = AnsibleModule(self.argspec)
 
+        result = self._obtain_token()
+        if self.module.params['gc']:
+            result['gc'] = self._collect_expired_tokens(
+                self.module.params['gc_batch_size'])
+            if result['gc']['deleted']:
+                result['changed'] = True
+        self.module.exit_json(**result)
+
+    def _obtain_token (self):
         def bearer_token(name, secret):
             return "%s:%s" % (name, secret)
 
         for token in self._get_tokens_with_stem(self.stem):
-            self.module.exit_json(
+            return dict(
                 changed=False,
                 bearer_token=bearer_token(token['metadata']['name'],
-                                          token['token']))
+                                          token['token']),
+                expires_at=token.get('expiresAt', ''))
 
         # No token? No problem, let's make one up!
         user_login_name = self.module.params['impersonate']
         user = self.get_user_by_name(user_login_name)
         token = self._make_fresh_token()
         name = self.stem + self._make_random_string(length=6)
+        expires_at_zulu = self.new_token_expires_at_zulu
 
-        self._kubectl_apply('''
-apiVersion: management.cattle.io/v3
-kind: Token
-metadata:
-  name: %(name)s
-  labels:
-    authn.management.cattle.io/kind: kubeconfig
-    authn.management.cattle.io/token-userId: %(user_id)s
-    cattle.io/creator: Ansible
-authProvider: local
-description: Kubeconfig token generated by the epfl_si.rancher Ansible collection
-expired: false
-expiresAt: "%(expires_at_zulu)s"
-token: %(token)s
-userId: %(user_id)s
-userPrincipal:
-  displayName: %(user_display_name)s
-  loginName: %(user_login_name)s
-  metadata:
-    creationTimestamp: null
-    name: local://%(user_id)s
-  principalType: user
-  provider: local
-''' %   dict(
-            name=name,
-            user_id=user['metadata']['name'],
-            expires_at_zulu=self.new_token_expires_at_zulu,
-            token=token,
-            user_display_name=user['displayName'],
-            user_login_name=user_login_name))
-        self.module.exit_json(
+        self._kube_api.call(
+            'POST', self._tokens_path,
+            body={
+                "apiVersion": "management.cattle.io/v3",
+                "kind": "Token",
+                "metadata": {
+                    "name": name,
+                    "labels": {
+                        "authn.management.cattle.io/kind": "kubeconfig",
+                        "authn.management.cattle.io/token-userId": user['metadata']['name'],
+                        "cattle.io/creator": "Ansible",
+                    },
+                },
+                "authProvider": "local",
+                "description": "Kubeconfig token generated by the epfl_si.rancher Ansible collection",
+                "expired": False,
+                "expiresAt": expires_at_zulu,
+                "token": token,
+                "userId": user['metadata']['name'],
+                "userPrincipal": {
+                    "displayName": user['displayName'],
+                    "loginName": user_login_name,
+                    "metadata": {
+                        "creationTimestamp": None,
+                        "name": "local://%s" % user['metadata']['name'],
+                    },
+                    "principalType": "user",
+                    "provider": "local",
+                },
+            })
+        return dict(
             changed=True,
-            bearer_token=bearer_token(name, token))
+            bearer_token=bearer_token(name, token),
+            expires_at=expires_at_zulu)
+
+    def _collect_expired_tokens (self, batch_size):
+        started = time.monotonic()
+        deleted = 0
+        more = False
+        for tok in self._kube_api.list(self._tokens_path,
+                                       label_selector='cattle.io/creator=Ansible',
+                                       page_size=batch_size):
+            if not is_expired(tok):
+                continue
+            if deleted >= batch_size:
+                more = True
+                break
+            try:
+                self._kube_api.call(
+                    'DELETE', '%s/%s' % (self._tokens_path, tok['metadata']['name']))
+            except KubernetesAPIClient.Error as e:
+                if e.status != 404:  # Someone else may have beaten us to it
+                    raise
+            deleted += 1
+
+        return dict(deleted=deleted, more=more,
+                    elapsed=round(time.monotonic() - started, 3))
+
+    _tokens_path = '/apis/management.cattle.io/v3/tokens'
+    _users_path = '/apis/management.cattle.io/v3/users'
 
     def get_user_by_name (self, username):
-        print("username: %s" % username)
-        [the_user] = (user for user in self._kubectl_get(
-                                 'User.management.cattle.io')
-                      if user.get('username', None) == username)
-        return the_user
+        # Users can't be looked up by `username` server-side; at least
+        # we stop downloading as soon as we find them.
+        for user in self._kube_api.list(self._users_path):
+            if user.get('username', None) == username:
+                return user
+        raise ValueError("No such user: %s" % username)
 
     def _get_tokens_with_stem (self, stem):
-        return (tok for tok in self._kubectl_get(
-                                 'Token.management.cattle.io')
-                if tok['metadata']['name'].startswith(stem))
-
-    def _kubectl_get (self, *cmdline):
-        kubectl_stdout = self._kubectl_subprocess(
-            ['get', '-o', 'json'] + list(cmdline),
-            stdout=subprocess.PIPE).stdout
-        return json.loads(kubectl_stdout)['items']
-
-    def _kubectl_apply (self, yaml_string):
-        self._kubectl_subprocess(
-            ['apply', '-f', '-'],
-            input=yaml_string.encode('utf-8'))
-
-    def _kubectl_subprocess (self, args, **subprocess_run_kwargs):
-        kubectl_path = shutil.which('kubectl',
-                                    path="/usr/local/bin:%s" % os.environ.get('PATH', ''))
-        return subprocess.run(
-            args=[kubectl_path] + args,
-            shell=False,
-            check=True,
-            env=dict(KUBECONFIG=self._get_kubeconfig_path()),
-            **subprocess_run_kwargs)
+        # Only look at the tokens that we minted ourselves (see the
+        # labels in __init__), rather than all of them.
+        return (tok for tok in self._kube_api.list(
+                                 self._tokens_path,
+                                 label_selector='cattle.io/creator=Ansible')
+                if tok['metadata']['name'].startswith(stem)
+                and not is_expired(tok))
+
+    @cached_property
+    def _kube_api (self):
+        return KubernetesAPIClient(self._get_kubeconfig_path(),
+                                   timeout=self.module.params['api_timeout'])
 
     def _get_kubeconfig_path (self):
         for guess in (
@@ -201,7 +383,7 @@ userPrincipal:
 
     @property
     def new_token_expires_at_zulu (self):
-        expires_at = datetime.datetime.now() + parse_duration(
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + parse_duration(
             self.module.params['validity'])
         return expires_at.strftime("%Y-%m-%dT%H:%M:%SZ")
 
@@ -0,0 +1,105 @@
+# This file is here for ansible-doc purposes **only**. The actual
+# implementation is in ../action/cached_login.py as an action plugin
+# (i.e. it runs on the Ansible controller.)
+
+DOCUMENTATION = r'''
+---
+module: cached_login
+short_description: Log in to Rancher, unless the cached credentials are still good
+description:
+- This module is implemented as an B(action plugin), meaning that it
+  runs on the Ansible controller (*not* over any remote shell,
+  regardless of `ansible_connection` etc. settings)
+
+- This action plugin checks whether the kubeconfig file at
+  C(kubeconfig) holds credentials that the cluster's API server still
+  accepts, by means of one C(SelfSubjectReview) API call (or, on
+  Kubernetes versions prior to 1.28, one C(SelfSubjectAccessReview)).
+  If not, it downloads a new kubeconfig from Rancher the same way as
+  M(epfl_si.rancher.rancher_login) does, and writes it (with mode
+  0600) to C(kubeconfig).
+
+- When it downloads a kubeconfig, this action plugin also asks Rancher
+  when the bearer token therein expires, and records that next to
+  the kubeconfig file (in a file named after it, with an
+  C(.expiry.json) suffix). As long as the kubeconfig file is
+  unchanged, and more than C(refresh_margin) seconds away from
+  expiry, it is deemed valid without any API call at all; past that,
+  it is downloaded anew without probing first.
+
+- Positive checks are remembered for as long as the file doesn't
+  change, but only within the Ansible worker process (i.e. for one
+  task and one host). Failing to reach the API server at all (e.g.
+  because of a stale CA certificate) counts as a negative check.
+  Refreshing
+  a given kubeconfig file is serialized with a lock file (named
+  after it, with a C(.lock) suffix), so that when many hosts share the
+  same cluster, only the first of them actually downloads a new
+  kubeconfig; the others check the file again once they get the lock,
+  and find it valid.
+
+- This action plugin reads from the same Ansible variables as
+  M(epfl_si.rancher.rancher_login), plus C(ansible_k8s_kubeconfig)
+  which is the default for the C(kubeconfig) task argument. It
+  honors delegation (i.e. these variables are the ones of the
+  delegate, if any).
+
+options:
+  kubeconfig:
+    description: >
+      The path to the kubeconfig file (on the Ansible controller).
+      Defaults to the value of the C(ansible_k8s_kubeconfig)
+      variable.
+  cluster_name:
+    description: >
+      The name of the cluster (the one you see in the
+      “name” column on the Rancher dashboard). Defaults
+      to the value of the C(ansible_rancher_cluster_name)
+      variable.
+  refresh_margin:
+    type: int
+    description: >
+      How long before the token expires to download a new kubeconfig,
+      in seconds. Defaults to the value of the
+      C(ansible_rancher_kubeconfig_refresh_margin) variable, or 3600.
+
+version_added: 0.14.0
+
+'''
+
+RETURN = r'''
+changed:
+  type: bool
+  description: True (“yellow”) iff the kubeconfig file was (or, in check mode, would be)
+               downloaded anew.
+
+kubeconfig:
+  description: The absolute path to the kubeconfig file.
+  type: str
+
+cluster_name:
+  description: The name of the cluster that the kubeconfig file is for.
+  type: str
+
+outcome:
+  description: >
+    C(unexpired) if the kubeconfig was deemed valid based on its recorded
+    expiry date alone; C(valid) if it was deemed valid after checking
+    with the API server (or earlier in the same Ansible worker);
+    C(refreshed) if it was downloaded anew.
+  type: str
+
+expires_at:
+  description: The expiration date of the bearer token in the kubeconfig, in ISO 8601 format,
+               if known.
+  type: str
+
+summary:
+  description: A one-line summary of C(cluster_name), C(outcome) and C(expires_at), for humans.
+  type: str
+'''
+
+EXAMPLES = r'''
+- epfl_si.rancher.cached_login:
+    kubeconfig: "{{ lookup('env', 'K8S_AUTH_KUBECONFIG') }}"
+'''
@@ -30,10 +30,11 @@ options:
       Note that deleting a project (with V(absent)) wont't delete
       the namespaces and resources that formerly belonged to the project.
   name:
-    required: true
+    required: false
     type: str
     description: >
-      The name of the Kubernetes C(Namespace) object.
+      The name of the Kubernetes C(Namespace) object. Required unless
+      O(namespaces) is set.
   is_system:
     required: false
     type: bool
@@ -56,14 +57,55 @@ options:
         type: str
         description: The name of the C(Project) object in the upstream Rancher,
            that this namespace should belong to.
+  namespaces:
+    type: list
+    elements: raw
+    version_added: 0.14.0
+    description: >
+      Reconcile many namespaces in one task. Each element is either a
+      namespace name, or a dict with keys C(name), C(state), C(is_system)
+      and C(project) (with the same meaning as the options of the same
+      names; C(state) defaults to O(state).) All namespaces are fetched
+      at once, and only those that are missing, superfluous or
+      mis-annotated are changed, using server-side apply. Mutually
+      exclusive with O(name).
+  concurrency:
+    type: int
+    default: 8
+    version_added: 0.14.0
+    description: When using O(namespaces), the maximum number of API
+      requests in flight.
 
 version_added: 0.10.0
 '''
 
+RETURN = r'''
+namespaces:
+  description: When using O(namespaces), what was done to each namespace
+    (V(created), V(updated), V(deleted), V(unchanged), or an error message
+    starting with V(failed))
+  type: dict
+  returned: when O(namespaces) is set
+  sample:
+    tenant-a: created
+    tenant-b: unchanged
+'''
+
 EXAMPLES = r'''
 
 - name: "`namespace/my-namespace`"
   epfl_si.rancher.namespace:
     name: "my-namespace"
     is_system: false
+
+- name: "Tenant namespaces"
+  epfl_si.rancher.namespace:
+    namespaces:
+      - tenant-a
+      - name: tenant-b
+        project:
+          namespace: c-m-t2gz7sxt
+          name: p-abcde
+      - name: tenant-z
+        state: absent
 '''
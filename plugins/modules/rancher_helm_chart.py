@@ -15,11 +15,33 @@ description:
   like a human operator would, when clicking their way through Charts
   > Installed Apps in the rancher UI.
 
+- The kubeconfig file (C(ansible_k8s_kubeconfig)) must point at the
+  Rancher manager's proxy for the cluster (i.e. its server URL looks
+  like C(https://rancher.example.com/k8s/clusters/c-m-abcd1234)), such
+  as the ones that M(epfl_si.rancher.rancher_login) makes; as the
+  Rancher Helm API is not available on the cluster's own API server.
+
 options:
   state:
     type: str
     default: V(present)
     description: The desired postcondition, either V(present) or V(absent)
+  charts:
+    type: list
+    elements: dict
+    version_added: 0.14.0
+    description: >
+      Install (or uninstall) several charts with one task. Each element
+      takes the same options as this action plugin (C(chart), C(release),
+      C(repository), C(namespace), C(version), C(values) etc.), which
+      default to the task-level ones; plus C(depends_on), a list of the
+      C(release) names of charts that must be installed first (or, with
+      O(state=absent), uninstalled last.) Charts that don't depend on one
+      another are handed over to Rancher together, and installed (or
+      uninstalled) concurrently; charts that do, are only handed over
+      once Rancher is done with all the charts they depend on (or,
+      with O(state=absent), all the charts that depend on them.)
+      Mutually exclusive with O(chart).
   repository:
     required: true
     type: str
@@ -27,9 +49,9 @@ options:
       The name of the repository, which must match the Kubernetes name of a
       C(kind: ClusterRepo) object defined in the Rancher manager cluster
   chart:
-    required: true
+    required: false
     type: str
-    description: The name of the chart to install.
+    description: The name of the chart to install. Required unless O(charts) is set.
   release:
     required: false
     type: str
@@ -74,12 +96,51 @@ options:
   timeout:
     type: str
     default: 600s
-    description: How long to wait for the Rancher manager RPC to complete
+    description: How long to wait for the Rancher manager RPC to complete,
+                 in Helm's duration format (e.g. V(600s) or V(1h30m)). We
+                 wait for the C(Operation) for 30 more seconds, then give up.
+                 An integer is taken as a number of seconds; a string
+                 without a unit (e.g. V("600")) fails the task before
+                 anything is installed or uninstalled.
 
 version_added: 0.7.0
 
 '''
 
+RETURN = r'''
+charts:
+  description: When O(charts) is set, the outcome for each chart, keyed by release name.
+               Each entry has the same fields as the return value of the single-chart form,
+               plus C(skipped) if one of the charts it depends on failed
+  type: dict
+  returned: when O(charts) is set
+operation:
+  description: How waiting for the Rancher C(Operation) (i.e. the C(helm install),
+               C(helm upgrade) etc. that Rancher runs on our behalf) went
+  type: dict
+  returned: when a chart was installed or upgraded
+  contains:
+    name:
+      description: The name of the C(Operation.catalog.cattle.io) object
+      type: str
+    namespace:
+      description: Its namespace
+      type: str
+    method:
+      description: V(watch) if we could watch the C(Operation) object through the
+                   Kubernetes API, or V(poll) if we had to fall back to polling it
+      type: str
+    events:
+      description: The number of watch events received
+      type: int
+    polls:
+      description: The number of times the C(Operation) object was fetched in full
+      type: int
+    wait_seconds:
+      description: How long the wait took
+      type: float
+'''
+
 EXAMPLES = r'''
 
 - name: "nfs-subdir-external-provisioner Helm chart"
@@ -94,4 +155,18 @@ EXAMPLES = r'''
         path: /myshare/some/sub/path
       storageClass:
         defaultClass: true
+
+- name: "Longhorn and MetalLB, in parallel"
+  epfl_si.rancher.rancher_helm_chart:
+    repository: rancher-charts
+    charts:
+      - chart: metallb
+        repository: metallb
+        namespace: metallb-system
+      - chart: longhorn-crd
+        namespace: longhorn-system
+      - chart: longhorn
+        namespace: longhorn-system
+        depends_on:
+          - longhorn-crd
 '''
@@ -62,6 +62,41 @@ description:
   (we think ?) with C(kubectl get token) in the C(local) cluster, even
   though they expire after two minutes.
 
+- C(ansible_rancher_token_validity)
+- (Optional) The validity time of newly minted bearer tokens, e.g.
+  C(30min). Defaults to two minutes.
+
+- C(ansible_rancher_token_gc)
+- (Optional, Boolean) Whenever a token is obtained over ssh, also
+  delete (a bounded number of) expired tokens that previous runs left
+  behind in the C(local) cluster. Defaults to false.
+
+- C(ansible_rancher_token_cache)
+- (Optional) The path to a file on the Ansible controller, where
+  bearer tokens are cached (with mode 0600) across tasks, hosts and
+  runs, keyed by Rancher URL and token stem. Cached tokens are reused
+  without ssh'ing into the Rancher master, until
+  C(ansible_rancher_token_cache_margin) seconds (default 30) before
+  they expire, or until Rancher rejects them. Unset by default,
+  meaning that every task obtains its token over ssh.
+
+- C(ansible_rancher_http_pool_size), C(ansible_rancher_http_timeout),
+  C(ansible_rancher_http_retries), C(ansible_rancher_http_backoff_factor)
+- (Optional) Tuning knobs for the keep-alive HTTP connection pool
+  that C(epfl_si.rancher) action plugins share within one task worker
+  (i.e. across C(loop) iterations, and within bulk modes such as
+  C(cluster_names)), when talking to the same Rancher manager.
+  Default to 10 connections, a 10-second connect /
+  120-second read timeout, and 3 retries (on HTTP 429 and 5xx
+  errors) with a backoff factor of 0.5 second.
+
+- C(ansible_rancher_http_stats)
+- (Optional, Boolean) If true, the action plugins of this collection
+  that talk to the Rancher manager (C(epfl_si.rancher.rancher_login),
+  C(epfl_si.rancher.cached_login), C(epfl_si.rancher.rancher_machine)
+  and C(epfl_si.rancher.rke2_registration)) return statistics about
+  the above connection pool, as C(rancher_http). Defaults to false.
+
 options:
   cluster_name:
     description: >
@@ -69,6 +104,33 @@ options:
       “name” column on the Rancher dashboard). Defaults
       to the value of the C(ansible_rancher_cluster_name)
       variable.
+  cluster_names:
+    type: list
+    elements: str
+    version_added: 0.14.0
+    description: >
+      Log into several clusters at once, instead of just
+      C(cluster_name). All clusters are looked up in a single Rancher
+      API call, and their kubeconfigs are downloaded concurrently.
+      The results are in the C(clusters) return value.
+  dest:
+    type: str
+    version_added: 0.14.0
+    description: >
+      Only with C(cluster_names). A template for the path of the
+      kubeconfig file to write for each cluster (atomically, with
+      mode 0600), in which C({cluster_name}) and C({cluster_id}) are
+      substituted, e.g. C(rke2-credentials-cache/{cluster_name}.yaml).
+      The files are written along with their expiry date, for the
+      benefit of M(epfl_si.rancher.cached_login). If unset, the
+      kubeconfigs are returned in C(clusters) instead.
+  concurrency:
+    type: int
+    default: 8
+    version_added: 0.14.0
+    description: >
+      Only with C(cluster_names). How many kubeconfigs to download in
+      parallel.
 
 version_added: 0.2.1
 
@@ -87,6 +149,34 @@ kubeconfig:
   description: The contents of the C(kubeconfig) file downloaded from the Rancher backend,
                as an unparsed, multiline YAML string.
   type: str
+
+expires_at:
+  description: The expiration date of the bearer token in C(kubeconfig), in ISO 8601 format;
+               or null if it doesn't expire (or if Rancher wouldn't say).
+  type: str
+  version_added: 0.14.0
+
+rancher_http:
+  description: >
+    Only if C(ansible_rancher_http_stats) is true. A dict with keys
+    C(connections), itself a dict with keys C(opened) (how many TCP
+    connections to the Rancher manager this task worker opened) and
+    C(reused) (how many requests went over an already-open connection);
+    and C(managers), itself a dict with keys C(hits), C(misses),
+    C(invalidations) and C(size) that describe the reuse of Rancher
+    API clients (with their tokens) within the task worker.
+  type: dict
+  returned: when requested
+  version_added: 0.14.0
+
+clusters:
+  description: >
+    Only with the C(cluster_names) option. A dict keyed by cluster name,
+    whose values have keys C(path) (if C(dest) is set) or C(kubeconfig)
+    (otherwise), C(expires_at), C(elapsed) (in seconds) and, if the
+    download failed, C(error).
+  type: dict
+  version_added: 0.14.0
 '''
 
 EXAMPLES = r'''
@@ -111,4 +201,10 @@ EXAMPLES = r'''
       {{ lookup("env", "K8S_AUTH_KUBECONFIG") }}
     content: >-
       {{ _rancher_login.kubeconfig }}
+
+- name: Log into many clusters at once
+  epfl_si.rancher.rancher_login:
+    cluster_names: "{{ groups['downstream_clusters'] | map('extract', hostvars, 'ansible_rancher_cluster_name') }}"
+    dest: "rke2-credentials-cache/{cluster_name}.yaml"
+  run_once: true
 '''
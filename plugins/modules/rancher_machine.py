@@ -0,0 +1,79 @@
+# This file is here for ansible-doc purposes **only**. The actual
+# implementation is in ../action/rancher_machine.py as an action plugin
+# (i.e. it runs on the Ansible controller.)
+
+DOCUMENTATION = r'''
+---
+module: rancher_machine
+short_description: Delete machines from a Rancher-managed cluster
+description:
+- This module is implemented as an B(action plugin), meaning that it
+  runs on the Ansible controller (*not* over any remote shell,
+  regardless of `ansible_connection` etc. settings)
+
+- This action plugin deletes C(machine.cluster.x-k8s.io) objects
+  from the Rancher manager, like the “Delete” action in the
+  “Machines” tab of the Rancher UI does. Rancher then takes care of
+  draining the corresponding nodes, and removing them from the cluster.
+
+- The cluster is the one that the C(ansible_rancher_cluster_name)
+  variable points to. See M(epfl_si.rancher.rancher_login) for the
+  other Ansible variables that this action plugin reads.
+
+options:
+  state:
+    type: str
+    required: true
+    description: The desired postcondition. Only V(absent) is supported.
+  name:
+    type: str
+    description: The name of the (Kubernetes) node whose machine should be deleted.
+      Exactly one of O(name) or O(names) must be set.
+  names:
+    version_added: 0.14.0
+    type: list
+    elements: str
+    description: The names of several nodes whose machines should be deleted,
+      concurrently.
+  concurrency:
+    version_added: 0.14.0
+    type: int
+    default: 8
+    description: When using O(names), the maximum number of deletions in flight.
+  max_etcd_deletions:
+    version_added: 0.14.0
+    type: int
+    default: 1
+    description: When using O(names), the maximum number of etcd and / or
+      control-plane machines that may be in the process of being deleted at any
+      given time. Must be at least 1. Each of them is waited for until Rancher is done removing it,
+      before the next one may start.
+  etcd_wait_timeout:
+    version_added: 0.14.0
+    type: int
+    default: 600
+    description: How long to wait (in seconds) for Rancher to remove each etcd
+      and / or control-plane machine, when using O(names).
+'''
+
+RETURN = r'''
+machines:
+  description: The outcome for each machine, keyed by name, when using O(names)
+  type: dict
+  returned: when O(names) is set
+  sample:
+    worker1:
+      existed: true
+      deleted: true
+      elapsed: 0.123
+'''
+
+EXAMPLES = r'''
+- name: Shrink the worker pool
+  epfl_si.rancher.rancher_machine:
+    state: absent
+    names:
+      - worker7
+      - worker8
+      - worker9
+'''
@@ -0,0 +1,152 @@
+import http.client
+import os
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = r"""
+---
+module: rke2_membership
+short_description: Find out whether an RKE2 node is a member of its cluster
+description:
+  - This module is intended for internal consumption by the
+      M(epfl_si.rancher.rke2_node) role. It is not really meant to be
+      used directly.
+  - This module runs on the node. It makes one API call to the local
+      RKE2 API server endpoint (which, on agent-only nodes, is the
+      RKE2 agent's load-balancing proxy), authenticated with the
+      kubelet's client certificate. The node is a member iff that
+      succeeds.
+  - It also looks at what the Rancher registration command left
+      behind on the node (the C(rancher-system-agent) configuration),
+      so as to tell apart nodes that were never registered from nodes
+      that were, but are not (yet) members.
+  - It only needs the Python standard library on the node.
+options:
+  url:
+    type: str
+    default: https://localhost:6443/api/v1
+    description:
+      - The URL to probe.
+  timeout:
+    type: float
+    default: 5
+    description:
+      - How long to wait for the probe to succeed, in seconds.
+  rke2_data_dir:
+    type: str
+    default: /var/lib/rancher/rke2
+    description:
+      - The RKE2 data directory, where the kubelet's client certificate
+        and the cluster's CA certificate are to be found.
+  agent_config:
+    type: str
+    default: /etc/rancher/agent/config.yaml
+    description:
+      - The configuration file of C(rancher-system-agent), which the
+        Rancher registration command creates.
+version_added: 0.14.0
+"""
+
+RETURN = r"""
+member:
+    description: Whether the node is a member of its RKE2 cluster
+    type: bool
+    returned: always
+state:
+    description: C(member) if the node is a member; C(registered) if
+      the Rancher registration command ran on it, but it is not a member
+      (yet); C(absent) otherwise
+    type: str
+    returned: always
+    sample: member
+probe:
+    description: What the probe did
+    type: dict
+    returned: always
+    contains:
+      status:
+        description: The HTTP status code, if the API server answered at all
+        type: int
+      error:
+        description: Why the probe failed, if it did
+        type: str
+      elapsed:
+        description: How long the probe took, in seconds
+        type: float
+changed:
+    description: Always false
+    type: bool
+    returned: always
+"""
+
+EXAMPLES = r"""
+- epfl_si.rancher.rke2_membership: {}
+  register: _rke2_membership
+
+- when: not _rke2_membership.member
+  ansible.builtin.debug:
+    msg: "Not a member: {{ _rke2_membership.probe.error }}"
+"""
+
+
+class RKE2MembershipModule:
+    argspec = dict(
+        url=dict(type='str', default='https://localhost:6443/api/v1'),
+        timeout=dict(type='float', default=5),
+        rke2_data_dir=dict(type='str', default='/var/lib/rancher/rke2'),
+        agent_config=dict(type='str', default='/etc/rancher/agent/config.yaml'))
+
+    def __init__ (self):
+        self.module = AnsibleModule(self.argspec, supports_check_mode=True)
+
+    def run (self):
+        probe = self._probe()
+        member = probe.get('status') == 200
+        if member:
+            state = 'member'
+        elif os.path.exists(self.module.params['agent_config']):
+            state = 'registered'
+        else:
+            state = 'absent'
+
+        self.module.exit_json(changed=False, member=member, state=state, probe=probe)
+
+    def _probe (self):
+        agent_dir = os.path.join(self.module.params['rke2_data_dir'], 'agent')
+        url = self.module.params['url']
+        started = time.monotonic()
+        outcome = {}
+
+        try:
+            context = ssl.create_default_context(
+                cafile=os.path.join(agent_dir, 'server-ca.crt'))
+            context.load_cert_chain(
+                os.path.join(agent_dir, 'client-kubelet.crt'),
+                os.path.join(agent_dir, 'client-kubelet.key'))
+
+            parsed = urlsplit(url)
+            conn = http.client.HTTPSConnection(
+                parsed.hostname, port=parsed.port or 443,
+                context=context, timeout=self.module.params['timeout'])
+            try:
+                conn.request('GET', parsed.path or '/')
+                response = conn.getresponse()
+                response.read()
+                outcome['status'] = response.status
+                if response.status != 200:
+                    outcome['error'] = 'HTTP status %d' % response.status
+            finally:
+                conn.close()
+        except (OSError, ssl.SSLError, socket.timeout, http.client.HTTPException) as e:
+            outcome['error'] = str(e) or e.__class__.__name__
+
+        outcome['elapsed'] = round(time.monotonic() - started, 3)
+        return outcome
+
+
+if __name__ == "__main__":
+    RKE2MembershipModule().run()
@@ -11,6 +11,11 @@ description:
 - This action plugin is intended for internal consumption by the M(epfl_si.rancher.rke2-node) role.
   It is not really meant to be used directly.
 
+- The M(epfl_si.rancher.rke2-node) role runs it only once per cluster
+  and per play batch (with C(run_once) and C(delegate_to) one of the
+  non-member nodes), and shares the outcome with all the cluster's
+  non-member nodes.
+
 - This action plugin acts as a helper to register nodes into an
   existing Rancher cluster. It ensures that at least one
   C(clusterregistrationtokens.management.cattle.io) object exists for